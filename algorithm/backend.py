@@ -0,0 +1,162 @@
+# backend.py
+# Planner backends providing the sampling, nearest neighbor and collision primitives
+
+import numpy as np
+
+from algorithm.collision import ObstacleIndex, box_arrays, obstacle_index, segment_hits_boxes, valid, valid_edge
+from algorithm.nearest_neighbor import nearest_neighbor, within_distance
+from algorithm.sampling import Sampler
+from structs.cartesian import Point, Space
+from structs.tree import CompactTree, Tree, TreeNode
+
+
+class PythonBackend:
+    """ Pure-Python backend: KD-tree nearest neighbor and per-obstacle checks """
+
+    def __init__(self, bounds: Space, obstacles=None, compact=None, sampler=None, nn_checks=None):
+        """
+        :param bounds: Bounds of the configuration space
+        :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+        :param compact: Store trees in contiguous arrays (CompactTree)
+        :param sampler: Sampler (uniform, seeded from the global random state if None)
+        :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None)
+        """
+        self.bounds = bounds
+        self.axes = bounds.axes
+        self.obstacles = obstacle_index(obstacles)
+        self.tree_type = CompactTree if compact else Tree
+        self.sampler = sampler if sampler is not None else Sampler(bounds)
+        self.nn_checks = nn_checks
+
+    def tree(self, root: Point):
+        """ Returns a new tree rooted at a point """
+        return self.tree_type(TreeNode(data=root))
+
+    def sample(self, n=1):
+        return self.sampler.sample(n=n)
+
+    def sample_values(self, n: int):
+        return self.sampler.sample_values(n)
+
+    def nearest(self, tree, pt: Point):
+        if self.nn_checks is not None:
+            return tree.index.nearest(pt, checks=self.nn_checks)
+        return nearest_neighbor(pt, tree.index)
+
+    def within(self, tree, pt: Point, distance: float):
+        return within_distance(pt, tree.index, distance)
+
+    def valid(self, pt: Point):
+        return valid(pt, self.bounds, self.obstacles)
+
+    def valid_edge(self, a: Point, b: Point):
+        return valid_edge(a, b, self.bounds, self.obstacles)
+
+    def evaluations(self, trees: list):
+        """ Returns the number of distance evaluations made by nearest neighbor queries on trees """
+        return sum(tree.index.evaluations for tree in trees)
+
+
+class NumpyBackend:
+    """
+    Vectorized NumPy backend.
+    Samples are drawn in blocks, nearest neighbors are found with one vectorized distance computation
+    over the tree's coordinate array and points are tested against all obstacles at once.
+    An ObstacleIndex passed as obstacles (e.g. an OccupancyGrid) is kept and answers the collision checks instead.
+    """
+
+    def __init__(self, bounds: Space, obstacles=None, compact=None, sampler=None, nn_checks=None, block=4096, rng=None):
+        """
+        :param bounds: Bounds of the configuration space
+        :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+        :param compact: Trees are always CompactTrees (True or None, False is rejected)
+        :param sampler: Sampler (uniform, drawing from rng, if None)
+        :param nn_checks: Not supported, nearest neighbors are always exact (must be None)
+        :param block: Number of samples drawn per block (when sampler is None)
+        :param rng: NumPy Generator (seeded from the global random state if None)
+        """
+        if compact is not None and not compact:
+            raise ValueError('The numpy backend always stores trees in contiguous arrays (compact must be True or None)')
+        if nn_checks is not None:
+            raise ValueError('The numpy backend only supports exact nearest neighbor search (nn_checks must be None)')
+        self.bounds = bounds
+        self.axes = bounds.axes
+        self.low, self.high = (a[0] for a in box_arrays([bounds], self.axes))
+        self.index = obstacles if isinstance(obstacles, ObstacleIndex) else None
+        self.obstacles_low, self.obstacles_high = box_arrays(list(obstacles or []) if self.index is None else [], self.axes)
+
+        self.sampler = sampler if sampler is not None else Sampler(bounds, seed=rng, block=block)
+        self.distance_evaluations = 0
+
+    def array(self, pt: Point):
+        """ Returns the coordinates of a point as an array in axis order """
+        if pt.axes == self.axes:
+            return np.array(pt.values)
+        return np.array([pt.coordinates[c] for c in self.axes])
+
+    def tree(self, root: Point):
+        """ Returns a new (unindexed) CompactTree rooted at a point """
+        return CompactTree(TreeNode(data=Point.from_values(self.axes, self.array(root).tolist())), indexed=False)
+
+    def sample(self, n=1):
+        return self.sampler.sample(n=n)
+
+    def sample_values(self, n: int):
+        return self.sampler.sample_values(n)
+
+    def sq_distances(self, tree: CompactTree, pt: Point):
+        self.distance_evaluations += tree.size
+        diff = tree.coords[:tree.size] - self.array(pt)
+        return np.einsum('ij,ij->i', diff, diff)
+
+    def nearest(self, tree: CompactTree, pt: Point):
+        return tree.node(int(np.argmin(self.sq_distances(tree, pt))))
+
+    def within(self, tree: CompactTree, pt: Point, distance: float):
+        return [tree.node(int(i)) for i in np.flatnonzero(self.sq_distances(tree, pt) < distance * distance)]
+
+    def in_bounds(self, q):
+        return bool(np.all(self.low <= q) and np.all(q <= self.high))
+
+    def valid(self, pt: Point):
+        if self.index is not None:
+            return valid(pt, self.bounds, self.index)
+        q = self.array(pt)
+        if not self.in_bounds(q):
+            return False
+        inside = np.all((self.obstacles_low <= q) & (q <= self.obstacles_high), axis=1)
+        return not inside.any()
+
+    def valid_edge(self, a: Point, b: Point):
+        if self.index is not None:
+            return valid_edge(a, b, self.bounds, self.index)
+        q = self.array(b)
+        if not self.in_bounds(q):
+            return False
+        return not segment_hits_boxes(self.array(a), q, self.obstacles_low, self.obstacles_high).any()
+
+    def evaluations(self, trees: list):
+        """ Returns the number of distance evaluations made by nearest neighbor queries """
+        return self.distance_evaluations
+
+
+BACKENDS = {
+    'python': PythonBackend,
+    'numpy': NumpyBackend
+}
+
+
+def make_backend(name: str, bounds: Space, obstacles=None, compact=None, sampler=None, nn_checks=None):
+    """
+    Construct a planner backend by name
+    :param name: Backend name ('python' or 'numpy')
+    :param bounds: Bounds of the configuration space
+    :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+    :param compact: Store trees in contiguous arrays (CompactTree; None for the backend's default)
+    :param sampler: Sampler (uniform, seeded from the global random state if None)
+    :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None)
+    :return: Backend
+    """
+    if name not in BACKENDS:
+        raise ValueError('Unknown backend \'{}\' (expected one of {})'.format(name, ', '.join(BACKENDS)))
+    return BACKENDS[name](bounds, obstacles=obstacles, compact=compact, sampler=sampler, nn_checks=nn_checks)
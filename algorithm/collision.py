@@ -0,0 +1,326 @@
+# collision.py
+# Collision checking
+
+import itertools
+import math
+from array import array
+
+import numpy as np
+
+from structs.cartesian import Point, Space
+
+
+def box_arrays(boxes: list, axes: tuple):
+    """
+    Returns (low, high) arrays of shape (len(boxes), dim) for a list of axis-aligned boxes (Spaces)
+    :param boxes: List of Spaces
+    :param axes: Axis order of the arrays
+    :return: (low, high)
+    """
+    if not boxes:
+        return np.empty((0, len(axes))), np.empty((0, len(axes)))
+    low = np.array([[box.bounds[c][0] for c in axes] for box in boxes], dtype=float)
+    high = np.array([[box.bounds[c][1] for c in axes] for box in boxes], dtype=float)
+    return low, high
+
+
+def segment_hits_boxes(a, b, low, high):
+    """
+    Exact segment vs. axis-aligned box test (slab method), vectorized across boxes
+    :param a: Segment start, array of shape (dim,)
+    :param b: Segment end, array of shape (dim,)
+    :param low: Lower box corners, array of shape (n, dim)
+    :param high: Upper box corners, array of shape (n, dim)
+    :return: Boolean array of shape (n,), True where the closed segment intersects the closed box
+    """
+    d = b - a
+    parallel = d == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t1 = (low - a) / d
+        t2 = (high - a) / d
+
+    # Axes the segment is parallel to either never leave the slab or never enter it
+    inside = (low <= a) & (a <= high)
+    t_low = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t1, t2))
+    t_high = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t1, t2))
+
+    t_enter = np.maximum(t_low.max(axis=1), 0.0)
+    t_exit = np.minimum(t_high.min(axis=1), 1.0)
+    return t_enter <= t_exit
+
+
+class ObstacleIndex:
+    """ Base class for collision-checking structures built once over a list of obstacles """
+
+    obstacles = None
+
+    def __iter__(self):
+        return iter(self.obstacles)
+
+    def __len__(self):
+        return len(self.obstacles)
+
+    def collides(self, pt: Point):
+        """ Returns True if the point lies within any obstacle """
+        raise NotImplementedError
+
+    def segment_collides(self, a: Point, b: Point):
+        """ Returns True if the straight segment between two points intersects any obstacle """
+        raise NotImplementedError
+
+
+class ObstacleGrid(ObstacleIndex):
+    """
+    Sparse uniform grid over axis-aligned obstacle boxes.
+    Each obstacle is registered in every cell it overlaps, so a point query only tests the obstacles of one cell.
+    """
+
+    def __init__(self, obstacles: list, cell_size=None, max_cells=64):
+        """
+        :param obstacles: Obstacles (Spaces) to index
+        :param cell_size: Cell edge length per axis (dict, float or None for the mean obstacle extent)
+        :param max_cells: Obstacles overlapping more cells than this are tested on every query instead
+        """
+        self.obstacles = list(obstacles)
+        self.cells = dict()
+        self.large = []
+        self.axes = self.obstacles[0].axes if self.obstacles else ()
+        self.low, self.high = box_arrays(self.obstacles, self.axes)
+
+        # Cell size defaults to the mean obstacle extent along each axis
+        if cell_size is None:
+            cell_size = {c: sum(obs.bounds[c][1] - obs.bounds[c][0] for obs in self.obstacles) / len(self.obstacles)
+                         for c in self.axes}
+        elif not isinstance(cell_size, dict):
+            cell_size = {c: cell_size for c in self.axes}
+        self.cell_size = tuple(max(cell_size[c], 1e-9) for c in self.axes)
+
+        self.max_cells = max_cells
+
+        # Cells hold obstacle indices
+        for i, obs in enumerate(self.obstacles):
+            ranges = self.cell_ranges(obs.bounds[c] for c in self.axes)
+            if self.n_cells(ranges) > max_cells:
+                self.large.append(i)
+                continue
+            for cell in itertools.product(*ranges):
+                self.cells.setdefault(cell, []).append(i)
+
+    def values(self, pt: Point):
+        return pt.values if pt.axes == self.axes else tuple(pt.coordinates[c] for c in self.axes)
+
+    def cell_ranges(self, extents):
+        """ Returns the ranges of cell indices along each axis covering (low, high) extents """
+        return [range(math.floor(low / size), math.floor(high / size) + 1)
+                for (low, high), size in zip(extents, self.cell_size)]
+
+    @staticmethod
+    def n_cells(ranges):
+        n = 1
+        for r in ranges:
+            n *= len(r)
+        return n
+
+    def cell(self, pt: Point):
+        """ Returns the grid cell containing a point """
+        return tuple(math.floor(v / size) for v, size in zip(self.values(pt), self.cell_size))
+
+    def candidates(self, pt: Point):
+        """ Returns the obstacles that may contain a point """
+        return [self.obstacles[i] for i in self.cells.get(self.cell(pt), [])] + [self.obstacles[i] for i in self.large]
+
+    def collides(self, pt: Point):
+        if not self.obstacles:
+            return False
+        return any(obs.within(pt) for obs in self.candidates(pt))
+
+    def segment_collides(self, a: Point, b: Point):
+        if not self.obstacles:
+            return False
+        a, b = self.values(a), self.values(b)
+
+        # Gather obstacles from the cells covering the segment's bounding box (all of them for long segments)
+        ranges = self.cell_ranges((min(u, v), max(u, v)) for u, v in zip(a, b))
+        if self.n_cells(ranges) > self.max_cells:
+            candidates = slice(None)
+        else:
+            candidates = set(self.large)
+            for cell in itertools.product(*ranges):
+                candidates.update(self.cells.get(cell, ()))
+            if not candidates:
+                return False
+            candidates = list(candidates)
+        return bool(segment_hits_boxes(np.array(a), np.array(b), self.low[candidates], self.high[candidates]).any())
+
+
+class OccupancyGrid(ObstacleIndex):
+    """
+    Dense raster of the configuration space, computed once per scene.
+    Each cell is free, fully covered by an obstacle or mixed. Point queries in free or covered cells are a
+    single lookup; only mixed cells (and points outside the raster) fall back to exact tests. With a
+    distance field, segments starting further from every obstacle than their length are accepted
+    without any test. The raster is conservative: a cell is only free if no obstacle touches it.
+    """
+
+    FREE, MIXED, FULL = 0, 1, 2
+
+    def __init__(self, obstacles: list, bounds: Space, resolution=None, max_cells=2 ** 20, distance=True, exact=True, max_clearance=None):
+        """
+        :param obstacles: Obstacles (Spaces) to rasterize
+        :param bounds: Region to rasterize (usually the bounds of the configuration space)
+        :param resolution: Cell edge length (None for the finest resolution within max_cells)
+        :param max_cells: Maximum number of cells; coarser cells are used if resolution would exceed it
+        :param distance: Compute the clearance (distance field) of every cell
+        :param exact: Test mixed cells exactly; if False they count as collisions (never a false free result)
+        :param max_clearance: Cap of the distance field (None for no cap). Only the cells within it of an obstacle are
+                              updated, so the build time no longer grows with the product of raster size and obstacle count.
+                              Segments only skip their test when shorter than the clearance, so a cap of about twice
+                              the planner's step loses nothing.
+        """
+        self.obstacles = list(obstacles)
+        self.exact_index = ObstacleGrid(self.obstacles)
+        self.axes = bounds.axes
+        self.exact = exact
+        self.max_clearance = max_clearance
+        self.origin = np.array([bounds.bounds[c][0] for c in self.axes], dtype=float)
+        extent = np.array([bounds.bounds[c][1] for c in self.axes], dtype=float) - self.origin
+
+        # Coarsen the requested resolution until the raster fits in max_cells
+        finest = (float(np.prod(extent)) / max_cells) ** (1.0 / len(self.axes))
+        resolution = max(resolution or 0.0, finest)
+        while True:
+            shape = tuple(max(int(math.ceil(e / resolution)), 1) for e in extent)
+            n = 1
+            for k in shape:
+                n *= k
+            if n <= max_cells:
+                break
+            resolution *= 1.01
+        self.resolution = resolution
+        self.inverse = 1.0 / resolution
+        self.shape = shape
+        self.corner = tuple(float(o) for o in self.origin)
+
+        state = np.zeros(shape, dtype=np.uint8)
+        low, high = box_arrays(self.obstacles, self.axes)
+        grid_low, grid_high = (low - self.origin) / resolution, (high - self.origin) / resolution
+        for lo, hi in zip(grid_low, grid_high):
+            # Touched cells, widened by one to stay conservative under rounding
+            touched = tuple(slice(max(int(math.floor(l)) - 1, 0), max(min(int(math.floor(h)) + 2, k), 0))
+                            for l, h, k in zip(lo, hi, shape))
+            state[touched] = np.maximum(state[touched], self.MIXED)
+            covered = tuple(slice(max(int(math.ceil(l)), 0), max(min(int(math.floor(h)), k), 0))
+                            for l, h, k in zip(lo, hi, shape))
+            state[covered] = self.FULL
+
+        # Flat byte and float arrays make the per-point lookups cheap
+        self.strides = tuple(int(s) for s in np.cumprod((1,) + shape[:0:-1])[::-1])
+        self.state = state.tobytes()
+        self.clearance_field = None
+        if distance:
+            self.clearance_field = array('f')
+            self.clearance_field.frombytes(self.clearances(low, high).tobytes())
+
+    def clearances(self, low, high):
+        """
+        Returns, for every cell, a lower bound on the distance from any of its points to the nearest obstacle
+        (per obstacle, the box-to-box distance is separable along the axes)
+        """
+        cap = self.max_clearance
+        field = np.full(self.shape, np.inf if cap is None else cap * cap, dtype=np.float32)
+        edges = [self.origin[k] + self.resolution * np.arange(n + 1) for k, n in enumerate(self.shape)]
+        for lo, hi in zip(low, high):
+            # Window of the cells that can be closer than the cap
+            if cap is None:
+                window = tuple(slice(0, n) for n in self.shape)
+            else:
+                window = tuple(slice(max(int(math.floor((l - cap - o) / self.resolution)), 0), max(min(int(math.ceil((h + cap - o) / self.resolution)), n), 0))
+                               for l, h, o, n in zip(lo, hi, self.origin, self.shape))
+                if any(w.start >= w.stop for w in window):
+                    continue
+            d2 = np.zeros(tuple(w.stop - w.start for w in window), dtype=np.float32)
+            for k, (e, w) in enumerate(zip(edges, window)):
+                gap = np.maximum(np.maximum(lo[k] - e[w.start + 1:w.stop + 1], e[w.start:w.stop] - hi[k]), 0.0).astype(np.float32)
+                view = [1] * len(self.shape)
+                view[k] = len(gap)
+                d2 += (gap * gap).reshape(view)
+            np.minimum(field[window], d2, out=field[window])
+        # Shrink slightly so float32 rounding never overstates a clearance
+        return np.sqrt(field) * np.float32(1 - 1e-6)
+
+    def flat_index(self, values):
+        """ Returns the flat index of the cell containing a point, or -1 outside the raster """
+        i = 0
+        inverse = self.inverse
+        for v, o, k, s in zip(values, self.corner, self.shape, self.strides):
+            if v < o:
+                return -1
+            c = int((v - o) * inverse)
+            if c >= k:
+                # Points on the upper boundary belong to the last cell
+                if v - o > k * self.resolution:
+                    return -1
+                c = k - 1
+            i += c * s
+        return i
+
+    def values(self, pt: Point):
+        return pt.values if pt.axes == self.axes else tuple(pt.coordinates[c] for c in self.axes)
+
+    def clearance(self, pt: Point):
+        """ Returns a lower bound on the distance from a point to the nearest obstacle (0 if unknown) """
+        if self.clearance_field is None:
+            return 0.0
+        i = self.flat_index(self.values(pt))
+        return self.clearance_field[i] if i >= 0 else 0.0
+
+    def collides(self, pt: Point):
+        i = self.flat_index(self.values(pt))
+        if i >= 0:
+            state = self.state[i]
+            if state == self.FREE:
+                return False
+            if state == self.FULL or not self.exact:
+                return True
+        return self.exact_index.collides(pt)
+
+    def segment_collides(self, a: Point, b: Point):
+        if self.clearance_field is not None:
+            # Segments shorter than the clearance of their start stay clear of every obstacle
+            i = self.flat_index(self.values(a))
+            if i >= 0 and self.clearance_field[i] > a.dist(b):
+                return False
+        return self.exact_index.segment_collides(a, b)
+
+
+def obstacle_index(obstacles):
+    """
+    Returns a collision-checking structure for obstacles, reusing it if one was given
+    :param obstacles: List of obstacles, an ObstacleIndex or None
+    :return: ObstacleIndex
+    """
+    if isinstance(obstacles, ObstacleIndex):
+        return obstacles
+    return ObstacleGrid(obstacles or [])
+
+
+def valid(pt: Point, bounds: Space, objects):
+    """ Ensure point to be placed is valid and not in collision """
+    if isinstance(objects, ObstacleIndex):
+        return bounds.within(pt) and not objects.collides(pt)
+    return bounds.within(pt) and not any(obj.within(pt) for obj in objects or [])
+
+
+def valid_edge(a: Point, b: Point, bounds: Space, objects):
+    """
+    Ensure the straight edge from a (assumed valid) to b is valid and not in collision.
+    The bounds are convex, so only the end point needs to be tested against them.
+    """
+    if not bounds.within(b):
+        return False
+    if isinstance(objects, ObstacleIndex):
+        return not objects.segment_collides(a, b)
+    if not objects:
+        return True
+    low, high = box_arrays(objects, a.axes)
+    return not segment_hits_boxes(np.array(a.values), np.array(a.aligned(b)), low, high).any()
@@ -0,0 +1,108 @@
+# metric.py
+# Weighted distance metrics for configuration spaces with unequal joint scales
+
+import math
+
+import numpy as np
+
+from algorithm.sinks import *
+from structs.cartesian import *
+from structs.tree import *
+
+
+class WeightedMetric:
+    """
+    Weighted Euclidean metric d(a, b) = sqrt(sum_i w_i (a_i - b_i)^2).
+    Scaling axis i by sqrt(w_i) turns it into the plain Euclidean distance, so planners, KD-trees and
+    costs can work unchanged in the scaled space.
+    """
+
+    def __init__(self, weights: dict):
+        """
+        :param weights: Weight of each axis (axes not listed have weight 1)
+        """
+        for axis, weight in weights.items():
+            if not weight > 0:
+                raise ValueError('Weight of axis {} ({}) must be > 0'.format(axis, weight))
+        self.weights = dict(weights)
+        self.scales = {axis: math.sqrt(weight) for axis, weight in weights.items()}
+
+    def factors(self, axes: tuple):
+        return [self.scales.get(c, 1.0) for c in axes]
+
+    def dist(self, a: Point, b: Point):
+        """ Returns the weighted distance between two points """
+        return math.sqrt(sum(s * s * (u - v) ** 2 for s, u, v in zip(self.factors(a.axes), a.values, a.aligned(b))))
+
+    def scale(self, pt: Point):
+        """ Maps a point to the scaled space """
+        return Point.from_values(pt.axes, [v * s for v, s in zip(pt.values, self.factors(pt.axes))])
+
+    def unscale(self, pt: Point):
+        """ Maps a point of the scaled space back """
+        return Point.from_values(pt.axes, [v / s for v, s in zip(pt.values, self.factors(pt.axes))])
+
+    def scale_space(self, space: Space):
+        """ Maps a space (bounds or obstacle) to the scaled space """
+        return Space(**{c: (low * self.scales.get(c, 1.0), high * self.scales.get(c, 1.0)) for c, (low, high) in space.bounds.items()})
+
+    def unscale_tree(self, tree, known=None):
+        """
+        Map the node coordinates of a tree planned in the scaled space back in place, and rebuild its index.
+        Node costs are kept, i.e. they are weighted path lengths.
+        :param tree: Tree or CompactTree
+        :param known: Dictionary of id(scaled point) to original point, to restore exact start and goal points
+        """
+        if isinstance(tree, CompactTree):
+            tree.coords[:tree.size] /= np.array(self.factors(tree.axes))
+        else:
+            known = known or dict()
+            for node in tree.all_nodes:
+                if node.data is not None:
+                    node.data = known.get(id(node.data)) or self.unscale(node.data)
+        tree.reindex()
+
+
+class UnscaledSink(EdgeSink):
+    """ Edge sink forwarding the edges of a planner running in a scaled space in original coordinates """
+
+    def __init__(self, sink: EdgeSink, metric: WeightedMetric):
+        self.sink = sink
+        self.metric = metric
+
+    def add(self, a: Point, b: Point, color=None):
+        self.sink.add(self.metric.unscale(a), self.metric.unscale(b), color)
+
+    def flush(self):
+        self.sink.flush()
+
+
+def plan_weighted(planner, start: Point, goal: Point, bounds: Space, epsilon: float, weights: dict, obstacles=None, ax=None, sink=None,
+                  **kwargs):
+    """
+    Run a planner under a weighted metric. Steering steps, the goal tolerance, neighborhoods and costs are all
+    measured with the weighted distance.
+    :param planner: Planner function (rrt, rrt_multi, rrt_connect or rrt_star)
+    :param start: Starting point
+    :param goal: Goal point
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum (weighted) distance to move between points
+    :param weights: Weight of each axis (axes not listed have weight 1)
+    :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+    :param ax: Axes object for visualization
+    :param sink: EdgeSink receiving every edge (in original coordinates)
+    :param kwargs: Other planner arguments (a sampler must sample metric.scale_space(bounds))
+    :return: Tree(s) and goal node if found, in original coordinates with weighted costs
+    """
+    metric = WeightedMetric(weights)
+    scaled_start, scaled_goal = metric.scale(start), metric.scale(goal)
+    scaled_obstacles = [metric.scale_space(obstacle) for obstacle in obstacles or []]
+    sink = edge_sink(sink, ax)
+    if sink is not None:
+        sink = UnscaledSink(sink, metric)
+
+    trees, goal_node = planner(scaled_start, scaled_goal, metric.scale_space(bounds), epsilon, obstacles=scaled_obstacles, sink=sink, **kwargs)
+    known = {id(scaled_start): start, id(scaled_goal): goal}
+    for tree in (trees if isinstance(trees, tuple) else (trees,)):
+        metric.unscale_tree(tree, known)
+    return trees, goal_node
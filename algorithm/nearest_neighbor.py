@@ -2,9 +2,19 @@
 # Nearest neighbor algorithm
 
 from structs.cartesian import Point
+from structs.kdtree import KDTree
 
 
 def nearest_neighbor(ref_point: Point, points, key=None):
+    """
+    Returns the nearest of points to ref_point
+    :param ref_point: Reference point
+    :param points: Iterable of points/items, or a KDTree index (key is then ignored)
+    :param key: Function mapping an item to its point
+    :return: Nearest item
+    """
+    if isinstance(points, KDTree):
+        return points.nearest(ref_point)
     dists = []
     if key:
         dists = [ref_point.dist(key(point)) for point in points]
@@ -14,6 +24,16 @@ def nearest_neighbor(ref_point: Point, points, key=None):
 
 
 def within_distance(ref_point: Point, points, distance: float, key=None):
+    """
+    Returns all of points strictly within distance of ref_point
+    :param ref_point: Reference point
+    :param points: Iterable of points/items, or a KDTree index (key is then ignored)
+    :param distance: Search radius
+    :param key: Function mapping an item to its point
+    :return: List of items
+    """
+    if isinstance(points, KDTree):
+        return points.within(ref_point, distance)
     dists = []
     if key:
         dists = [ref_point.dist(key(point)) for point in points]
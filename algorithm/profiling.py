@@ -0,0 +1,133 @@
+# profiling.py
+# Planner instrumentation: per-phase timers, counters and progress callbacks
+
+import time
+
+
+class PlannerStats:
+    """
+    Per-phase cumulative timers and counters of a planner run.
+    Planners only instrument themselves when given a PlannerStats, so there is no overhead otherwise.
+    Timers (seconds): sample, nearest, within, steer, valid, connect.
+    Counters: iterations, samples, collision_checks, rejected (failed collision checks), accepted (nodes added),
+    nn_evaluations (distance evaluations made by nearest neighbor and radius queries).
+    """
+
+    PHASES = ('sample', 'nearest', 'within', 'steer', 'valid', 'connect')
+    COUNTERS = ('iterations', 'samples', 'collision_checks', 'rejected', 'accepted', 'nn_evaluations')
+
+    def __init__(self, callback=None, every=1000):
+        """
+        :param callback: Function called with this PlannerStats and the current number of tree nodes every few iterations
+        :param every: Number of iterations between callbacks
+        """
+        self.timers = dict.fromkeys(self.PHASES, 0.0)
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.callback = callback
+        self.every = every
+        self.start = time.perf_counter()
+        self.total = 0.0
+
+    def iteration(self, n_nodes: int):
+        """ Count an iteration, invoking the callback if due """
+        self.counters['iterations'] += 1
+        if self.callback and self.counters['iterations'] % self.every == 0:
+            self.callback(self, n_nodes)
+
+    def timed(self, phase: str, func):
+        """ Returns func wrapped to accumulate its run time under phase """
+        timers = self.timers
+
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = func(*args, **kwargs)
+            timers[phase] += time.perf_counter() - t0
+            return result
+        return wrapper
+
+    def wrap(self, engine):
+        """ Returns an instrumented view of a planner backend """
+        return InstrumentedBackend(engine, self)
+
+    def finish(self, engine, trees: list):
+        """
+        Record end-of-run totals
+        :param engine: Planner backend (uninstrumented)
+        :param trees: Trees grown by the planner
+        """
+        self.total = time.perf_counter() - self.start
+        self.counters['accepted'] = sum(tree.added for tree in trees)
+        self.counters['nn_evaluations'] = engine.evaluations(trees)
+
+    def as_dict(self):
+        """ Returns the metrics as a JSON-serializable dictionary """
+        return {
+            'total': self.total,
+            'timers': dict(self.timers),
+            'counters': dict(self.counters)
+        }
+
+
+class InstrumentedBackend:
+    """ Planner backend view that times and counts calls to the wrapped backend """
+
+    def __init__(self, engine, stats: PlannerStats):
+        self.engine = engine
+        self.stats = stats
+        self.timers = stats.timers
+        self.counters = stats.counters
+
+    @property
+    def axes(self):
+        return self.engine.axes
+
+    @property
+    def sampler(self):
+        return self.engine.sampler
+
+    def tree(self, root):
+        return self.engine.tree(root)
+
+    def sample(self, n=1):
+        t0 = time.perf_counter()
+        pts = self.engine.sample(n=n)
+        self.timers['sample'] += time.perf_counter() - t0
+        self.counters['samples'] += n
+        return pts
+
+    def sample_values(self, n: int):
+        t0 = time.perf_counter()
+        values = self.engine.sample_values(n)
+        self.timers['sample'] += time.perf_counter() - t0
+        self.counters['samples'] += n
+        return values
+
+    def nearest(self, tree, pt):
+        t0 = time.perf_counter()
+        node = self.engine.nearest(tree, pt)
+        self.timers['nearest'] += time.perf_counter() - t0
+        return node
+
+    def within(self, tree, pt, distance: float):
+        t0 = time.perf_counter()
+        nodes = self.engine.within(tree, pt, distance)
+        self.timers['within'] += time.perf_counter() - t0
+        return nodes
+
+    def check(self, func, *args):
+        t0 = time.perf_counter()
+        result = func(*args)
+        self.timers['valid'] += time.perf_counter() - t0
+        self.counters['collision_checks'] += 1
+        if not result:
+            self.counters['rejected'] += 1
+        return result
+
+    def valid(self, pt):
+        return self.check(self.engine.valid, pt)
+
+    def valid_edge(self, a, b):
+        return self.check(self.engine.valid_edge, a, b)
+
+    def evaluations(self, trees: list):
+        return self.engine.evaluations(trees)
@@ -1,25 +1,130 @@
 # rrt.py
 # RRT algorithm implementation
 
-import matplotlib.lines as lines
+import math
 
+import numpy as np
+
+from algorithm.backend import make_backend
+from algorithm.collision import *
 from algorithm.nearest_neighbor import *
+from algorithm.sinks import *
+from algorithm.termination import *
 from structs.cartesian import *
 from structs.tree import *
 
 
 def new_conf(q_near: Point, q_samp: Point, delta_q: float):
+    """ Step delta_q from q_near towards q_samp (None if the two coincide, e.g. a goal-biased sample of a root) """
     q_vec = q_samp - q_near
-    q_vec_scaled = q_vec / q_vec.norm() * delta_q
-    return q_near + q_vec_scaled
+    norm = q_vec.norm()
+    if norm == 0:
+        return None
+    return q_near + q_vec * (delta_q / norm)
+
+
+def stopped(trees: list, reason: str, engine, stats=None, sink=None, solved=None):
+    """
+    Record why a planner stopped and whether it found a path on its trees, its final statistics if instrumented,
+    and flush its edge sink
+    :param trees: Trees grown by the planner
+    :param reason: Stop reason ('goal', 'limit', 'time_budget', 'max_nodes' or 'cancelled')
+    :param engine: Planner backend
+    :param stats: PlannerStats (None if not instrumented)
+    :param sink: EdgeSink (None if edges are dropped)
+    :param solved: Whether a path was found (only if the reason is 'goal' if None)
+    """
+    for tree in trees:
+        tree.stop_reason = reason
+        tree.solved = reason == 'goal' if solved is None else solved
+    if stats is not None:
+        stats.finish(engine, trees)
+    if sink is not None:
+        sink.flush()
 
 
-def valid(pt: Point, bounds: Space, objects: list):
-    """ Ensure point to be placed is valid and not in collision """
-    return bounds.within(pt) and not any([obj.within(pt) for obj in objects])
+def check_sparsity(epsilon: float, min_spacing, node_cap, compact: bool, backend: str):
+    """ Validate the spatial deduplication and node cap options of a planner """
+    if min_spacing is not None and not 0 <= min_spacing < epsilon:
+        raise ValueError('min_spacing ({}) must be >= 0 and smaller than epsilon ({})'.format(min_spacing, epsilon))
+    if node_cap is not None:
+        if node_cap < 2:
+            raise ValueError('node_cap ({}) must be >= 2'.format(node_cap))
+        if compact or backend != 'python':
+            raise ValueError('node_cap requires pruneable trees (backend=\'python\' without compact)')
 
 
-def rrt(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, color='red'):
+def check_sampling(n: int, candidates: int):
+    """ Validate the sample batch options of a planner (see choose_sample) """
+    if n < 1:
+        raise ValueError('n ({}) must be >= 1'.format(n))
+    if candidates < 1:
+        raise ValueError('candidates ({}) must be >= 1'.format(candidates))
+
+
+def crowded(engine, tree, pt: Point, min_spacing):
+    """ Returns True if a point lies within min_spacing of an existing node of a tree """
+    return min_spacing is not None and bool(engine.within(tree, pt, min_spacing))
+
+
+def enforce_cap(tree, target: Point, node_cap, keep=None):
+    """
+    Prune the least promising leaves of a tree that reached its node cap: the oldest ones.
+    A leaf that has not been extended since it was added is either shadowed by newer nodes or keeps failing its
+    extensions, while the frontier is made of recent leaves. The leaf closest to the target is never pruned.
+    A tenth of the cap is pruned at once; parents left childless become leaves themselves, so dead-end branches are
+    cut back over successive prunings.
+    :param tree: Tree (not a CompactTree)
+    :param target: Point the tree grows towards
+    :param node_cap: Maximum number of nodes (None for no cap)
+    :param keep: Node that must not be pruned (e.g. the goal node)
+    :return: True if the tree has room for a new node
+    """
+    if node_cap is None or len(tree.all_nodes) < node_cap:
+        return True
+    # all_nodes is in insertion order, so leaves come oldest first
+    leaves = [node for node in tree.all_nodes if not node.children and node is not tree.root and node is not keep]
+    if leaves:
+        closest = min(leaves, key=lambda node: node.data.dist(target))
+        count = len(tree.all_nodes) - node_cap + max(node_cap // 10, 1)
+        tree.prune([node for node in leaves if node is not closest][:count])
+    return len(tree.all_nodes) < node_cap
+
+
+def choose_sample(engine, tree, target: Point, n: int, tree_weight=0.0, candidates=4):
+    """
+    Sample n points and pick the most promising one for growing a tree towards a target.
+    Distances to the target are computed for the whole batch at once. Without tree_weight, the closest sample wins;
+    otherwise the best few samples are scored by distance to the target plus tree_weight times their distance to
+    the tree, so the nearest neighbor queries do not grow with n.
+    :param engine: Planner backend
+    :param tree: Tree to grow
+    :param target: Point to grow towards
+    :param n: Number of samples
+    :param tree_weight: Weight of the distance to the tree in the score
+    :param candidates: Number of samples whose distance to the tree is measured (if tree_weight)
+    :return: (sample, nearest node of tree)
+    """
+    axes = engine.axes
+    rows = engine.sample_values(n)
+    diff = rows - np.array(target.values if target.axes == axes else [target.coordinates[c] for c in axes])
+    d = np.einsum('ij,ij->i', diff, diff)
+    if not tree_weight or n == 1:
+        q_samp = Point.from_values(axes, rows[int(np.argmin(d))].tolist())
+        return q_samp, engine.nearest(tree, q_samp)
+
+    best = None
+    order = np.argpartition(d, candidates - 1)[:candidates] if n > candidates else range(n)
+    for i in order:
+        q_samp = Point.from_values(axes, rows[i].tolist())
+        q_near = engine.nearest(tree, q_samp)
+        score = math.sqrt(d[i]) + tree_weight * q_samp.dist(q_near.data)
+        if best is None or score < best[0]:
+            best = (score, q_samp, q_near)
+    return best[1], best[2]
+
+
+def rrt(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, color='red', compact=None, backend='python', check_edges=False, time_budget=None, max_nodes=None, cancel=None, stats=None, sink=None, sampler=None, nn_checks=None, min_spacing=None, node_cap=None):
     """
     Basic RRT algorithm.
     :param start: Starting point
@@ -28,62 +133,76 @@ def rrt(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, ob
     :param epsilon: Maximum distance to move between points
     :param limit: Number of iterations/nodes to be added
     :param obstacles: Obstacles in configuration space
-    :param ax: Axes object for visualization
+    :param ax: Axes object for visualization (drawn with a LineCollectionSink unless sink is given)
     :param color: Tree color
-    :return: RRT and goal node if found
+    :param compact: Store the tree in contiguous arrays (CompactTree; None for the backend's default)
+    :param backend: Planner backend ('python' or 'numpy')
+    :param check_edges: Reject edges intersecting an obstacle (exact segment tests), not only end points
+    :param time_budget: Time in seconds after which to stop (None for no limit)
+    :param max_nodes: Number of tree nodes after which to stop (None for no limit)
+    :param cancel: CancellationToken to stop the planner early
+    :param stats: PlannerStats collecting per-phase timers and counters (None to disable instrumentation)
+    :param sink: EdgeSink receiving every edge added to the tree(s) (None to drop edges)
+    :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+    :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None);
+                      worthwhile in high dimensions
+    :param min_spacing: Reject new nodes closer than this to an existing node of their tree (None to accept all)
+    :param node_cap: Maximum number of nodes per tree, the least promising leaves are pruned to stay below it (None for no cap)
+    :return: RRT and goal node if found (tree.stop_reason records why the planner stopped)
     """
 
     # Ensure start and end have same dimension
     if start.dim != goal.dim:
         raise ValueError('Start point dimension ({}) and goal point dimension ({}) are must be equal'.format(start.dim, goal.dim))
+    check_sparsity(epsilon, min_spacing, node_cap, compact, backend)
 
     # Initialize RRT
-    start_node = TreeNode(data=start)
-    tree = Tree(start_node)
-
-    # Iterate until limit reached
+    engine = make_backend(backend, bounds, obstacles=obstacles, compact=compact, sampler=sampler, nn_checks=nn_checks)
+    sink = edge_sink(sink, ax)
+    steer = new_conf
+    if stats is not None:
+        engine, steer = stats.wrap(engine), stats.timed('steer', new_conf)
+    tree = engine.tree(start)
+
+    # Iterate until limit or budget reached
+    budget = Budget(time_budget=time_budget, max_nodes=max_nodes, cancel=cancel, stats=stats)
     for _ in range(limit):
+        if budget.reached(len(tree.all_nodes)):
+            break
+        if not enforce_cap(tree, goal, node_cap):
+            continue
+
         # Sample point
-        q_samp = bounds.sample()
+        q_samp = engine.sample()
 
         # Find nearest neighbor in tree
-        q_near = nearest_neighbor(q_samp,
-                                  tree.all_nodes,
-                                  key=lambda node: node.data)
+        q_near = engine.nearest(tree, q_samp)
         # Compute new point
-        q_new = new_conf(q_near.data, q_samp, epsilon)
+        q_new = steer(q_near.data, q_samp, epsilon)
+        if q_new is None:
+            continue
 
         # Check collision and add to tree
-        if valid(q_new, bounds, obstacles):
+        if (engine.valid_edge(q_near.data, q_new) if check_edges else engine.valid(q_new)) and not crowded(engine, tree, q_new, min_spacing):
             # Create new node in tree
-            new_node = TreeNode(parent=q_near,
-                                data=q_new,
-                                cost=(q_near.cost + epsilon))
-            q_near.children.append(new_node)
-            tree.all_nodes.append(new_node)
+            new_node = tree.add(q_near, q_new, cost=(q_near.cost + epsilon))
 
             # Update visualization
-            if ax:
-                ax.add_line(lines.Line2D(
-                    (q_near.data.coordinates['x'], q_new.coordinates['x']),
-                    (q_near.data.coordinates['y'], q_new.coordinates['y']),
-                    linewidth=1,
-                    color=color))
+            if sink is not None:
+                sink.add(q_near.data, q_new, color)
 
             # Check if goal can be added, return success
-            if goal.dist(q_new) < epsilon:
-                goal_node = TreeNode(parent=new_node,
-                                     data=goal,
-                                     cost=(new_node.cost + goal.dist(q_new)))
-                new_node.children.append(goal_node)
-                tree.all_nodes.append(goal_node)
+            if goal.dist(q_new) < epsilon and (not check_edges or engine.valid_edge(q_new, goal)):
+                goal_node = tree.add(new_node, goal, cost=(new_node.cost + goal.dist(q_new)))
+                stopped([tree], 'goal', engine, stats, sink)
                 return tree, goal_node
 
     # Return None if fail
+    stopped([tree], budget.reason or 'limit', engine, stats, sink)
     return tree, None
 
 
-def rrt_multi(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, color='red', n=3):
+def rrt_multi(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, color='red', n=3, compact=None, backend='python', check_edges=False, time_budget=None, max_nodes=None, cancel=None, stats=None, sink=None, sampler=None, nn_checks=None, min_spacing=None, node_cap=None, tree_weight=0.0, candidates=4, explore=False):
     """
     Semi-greedy informed RRT algorithm.
     Samples multiple points for growth.
@@ -93,62 +212,80 @@ def rrt_multi(start: Point, goal: Point, bounds: Space, epsilon: float, limit=50
     :param epsilon: Maximum distance to move between points
     :param limit: Number of iterations/nodes to be added
     :param obstacles: Obstacles in configuration space
-    :param ax: Axes object for visualization
+    :param ax: Axes object for visualization (drawn with a LineCollectionSink unless sink is given)
     :param color: Tree color
     :param n: Number of points to sample
-    :return: RRT and goal node if found
+    :param compact: Store the tree in contiguous arrays (CompactTree; None for the backend's default)
+    :param backend: Planner backend ('python' or 'numpy')
+    :param check_edges: Reject edges intersecting an obstacle (exact segment tests), not only end points
+    :param time_budget: Time in seconds after which to stop (None for no limit)
+    :param max_nodes: Number of tree nodes after which to stop (None for no limit)
+    :param cancel: CancellationToken to stop the planner early
+    :param stats: PlannerStats collecting per-phase timers and counters (None to disable instrumentation)
+    :param sink: EdgeSink receiving every edge added to the tree(s) (None to drop edges)
+    :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+    :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None);
+                      worthwhile in high dimensions
+    :param min_spacing: Reject new nodes closer than this to an existing node of their tree (None to accept all)
+    :param node_cap: Maximum number of nodes per tree, the least promising leaves are pruned to stay below it (None for no cap)
+    :param tree_weight: Score samples by distance to the goal plus tree_weight times distance to the tree (0 for the closest
+                        sample to the goal)
+    :param candidates: Number of best samples whose distance to the tree is measured (if tree_weight)
+    :param explore: After a blocked extension, grow towards a single uniform sample on the next iteration
+                    (keeps large n from stalling in front of obstacles)
+    :return: RRT and goal node if found (tree.stop_reason records why the planner stopped)
     """
 
     # Ensure start and end have same dimension
     if start.dim != goal.dim:
         raise ValueError('Start point dimension ({}) and goal point dimension ({}) are must be equal'.format(start.dim, goal.dim))
+    check_sparsity(epsilon, min_spacing, node_cap, compact, backend)
+    check_sampling(n, candidates)
 
     # Initialize RRT
-    start_node = TreeNode(data=start)
-    tree = Tree(start_node)
-
-    # Iterate until limit reached
+    engine = make_backend(backend, bounds, obstacles=obstacles, compact=compact, sampler=sampler, nn_checks=nn_checks)
+    sink = edge_sink(sink, ax)
+    steer = new_conf
+    if stats is not None:
+        engine, steer = stats.wrap(engine), stats.timed('steer', new_conf)
+    tree = engine.tree(start)
+
+    # Iterate until limit or budget reached
+    budget = Budget(time_budget=time_budget, max_nodes=max_nodes, cancel=cancel, stats=stats)
+    blocked = False
     for _ in range(limit):
-        # Sample n points and pick closest point to goal
-        q_samp = bounds.sample(n=n)
-        q_samp = min(q_samp,
-                     key=lambda pt: pt.dist(goal))
+        if budget.reached(len(tree.all_nodes)):
+            break
+        if not enforce_cap(tree, goal, node_cap):
+            continue
 
-        # Find nearest neighbor in tree
-        q_near = nearest_neighbor(q_samp,
-                                  tree.all_nodes,
-                                  key=lambda node: node.data)
+        # Sample n points, pick the most promising one and find its nearest neighbor in tree
+        q_samp, q_near = choose_sample(engine, tree, goal, 1 if blocked else n, tree_weight=tree_weight, candidates=candidates)
 
         # Compute new point
-        q_new = new_conf(q_near.data, q_samp, epsilon)
+        q_new = steer(q_near.data, q_samp, epsilon)
+        if q_new is None:
+            continue
 
         # Check collision and add to tree
-        if valid(q_new, bounds, obstacles):
+        blocked = explore
+        if (engine.valid_edge(q_near.data, q_new) if check_edges else engine.valid(q_new)) and not crowded(engine, tree, q_new, min_spacing):
+            blocked = False
             # Create new node in tree
-            new_node = TreeNode(parent=q_near,
-                                data=q_new,
-                                cost=(q_near.cost + epsilon))
-            q_near.children.append(new_node)
-            tree.all_nodes.append(new_node)
+            new_node = tree.add(q_near, q_new, cost=(q_near.cost + epsilon))
 
             # Update visualization
-            if ax:
-                ax.add_line(lines.Line2D(
-                    (q_near.data.coordinates['x'], q_new.coordinates['x']),
-                    (q_near.data.coordinates['y'], q_new.coordinates['y']),
-                    linewidth=1,
-                    color=color))
+            if sink is not None:
+                sink.add(q_near.data, q_new, color)
 
             # Check if goal can be added, return success
-            if goal.dist(q_new) < epsilon:
-                goal_node = TreeNode(parent=new_node,
-                                     data=goal,
-                                     cost=(new_node.cost + goal.dist(q_new)))
-                new_node.children.append(goal_node)
-                tree.all_nodes.append(goal_node)
+            if goal.dist(q_new) < epsilon and (not check_edges or engine.valid_edge(q_new, goal)):
+                goal_node = tree.add(new_node, goal, cost=(new_node.cost + goal.dist(q_new)))
+                stopped([tree], 'goal', engine, stats, sink)
                 return tree, goal_node
 
     # Return None if fail
+    stopped([tree], budget.reason or 'limit', engine, stats, sink)
     return tree, None
 
 
@@ -160,7 +297,34 @@ def connect(f_node: TreeNode, b_node: TreeNode):
     b_node.parent = f_node
 
 
-def rrt_connect(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, f_color='red', b_color='green'):
+def connection(new_nodes: list, forward_tree, backward_tree, epsilon: float, engine, check_edges=False):
+    """
+    Find a pair of nodes, one from each tree, that are within epsilon of each other.
+    Only newly added nodes are tested since all older pairs have already been ruled out.
+    :param new_nodes: List of (node, tree) pairs added since the last check
+    :param forward_tree: Forward RRT
+    :param backward_tree: Backward RRT
+    :param epsilon: Maximum connection distance
+    :param engine: Planner backend used for nearest neighbor queries
+    :param check_edges: Only accept pairs whose bridge edge is collision free
+    :return: (forward node, backward node) if found, otherwise None
+    """
+    for node, tree in new_nodes:
+        other_tree = backward_tree if tree is forward_tree else forward_tree
+        if check_edges:
+            # Any node within epsilon may be bridged, take the closest with a collision-free edge
+            candidates = sorted(engine.within(other_tree, node.data, epsilon), key=lambda other: other.data.dist(node.data))
+            other_node = next((other for other in candidates if engine.valid_edge(node.data, other.data)), None)
+        else:
+            other_node = engine.nearest(other_tree, node.data)
+            if other_node.data.dist(node.data) >= epsilon:
+                other_node = None
+        if other_node:
+            return (node, other_node) if tree is forward_tree else (other_node, node)
+    return None
+
+
+def rrt_connect(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, f_color='red', b_color='green', compact=None, backend='python', check_edges=False, time_budget=None, max_nodes=None, cancel=None, stats=None, sink=None, sampler=None, nn_checks=None, min_spacing=None, node_cap=None, n=1, tree_weight=0.0, candidates=4):
     """
     RRT-connect algorithm.
     :param start: Starting point
@@ -169,60 +333,281 @@ def rrt_connect(start: Point, goal: Point, bounds: Space, epsilon: float, limit=
     :param epsilon: Maximum distance to move between points
     :param limit: Number of iterations/nodes to be added
     :param obstacles: Obstacles in configuration space
-    :param ax: Axes object for visualization
+    :param ax: Axes object for visualization (drawn with a LineCollectionSink unless sink is given)
     :param f_color: Forward tree color
     :param b_color: Backward tree color
-    :return: RRTs (forward, backward) and goal node if found
+    :param compact: Store the trees in contiguous arrays (CompactTree; None for the backend's default)
+    :param backend: Planner backend ('python' or 'numpy')
+    :param check_edges: Reject edges intersecting an obstacle (exact segment tests), not only end points
+    :param time_budget: Time in seconds after which to stop (None for no limit)
+    :param max_nodes: Number of tree nodes after which to stop (None for no limit)
+    :param cancel: CancellationToken to stop the planner early
+    :param stats: PlannerStats collecting per-phase timers and counters (None to disable instrumentation)
+    :param sink: EdgeSink receiving every edge added to the tree(s) (None to drop edges)
+    :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+    :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None);
+                      worthwhile in high dimensions
+    :param min_spacing: Reject new nodes closer than this to an existing node of their tree (None to accept all)
+    :param node_cap: Maximum number of nodes per tree, the least promising leaves are pruned to stay below it (None for no cap)
+    :param n: Number of points sampled per tree and iteration; with n > 1 each tree grows towards the best sample for
+              reaching the newest node of the other tree (see rrt_multi_connect)
+    :param tree_weight: Score samples by distance to that node plus tree_weight times distance to the tree (if n > 1)
+    :param candidates: Number of best samples whose distance to the tree is measured (if tree_weight)
+    :return: RRTs (forward, backward) and goal node if found (tree.stop_reason records why the planner stopped)
     """
 
     # Ensure start and end have same dimension
     if start.dim != goal.dim:
         raise ValueError('Start point dimension ({}) and goal point dimension ({}) are must be equal'.format(start.dim, goal.dim))
+    check_sparsity(epsilon, min_spacing, node_cap, compact, backend)
+    check_sampling(n, candidates)
 
     # Initialize forward and backward RRTs
-    start_node = TreeNode(data=start)
-    goal_node = TreeNode(data=goal)
-    forward_tree = Tree(start_node)
-    backward_tree = Tree(goal_node)
-
-    # Iterate until limit reached
+    base_engine = engine = make_backend(backend, bounds, obstacles=obstacles, compact=compact, sampler=sampler, nn_checks=nn_checks)
+    sink = edge_sink(sink, ax)
+    steer, find_connection = new_conf, connection
+    if stats is not None:
+        engine, steer, find_connection = stats.wrap(engine), stats.timed('steer', new_conf), stats.timed('connect', connection)
+    forward_tree = engine.tree(start)
+    backward_tree = engine.tree(goal)
+    goal_node = backward_tree.root
+
+    # Nodes not yet tested against the opposite tree (roots are tested on the first pass)
+    new_nodes = [(forward_tree.root, forward_tree)]
+
+    # Iterate until limit or budget reached
+    budget = Budget(time_budget=time_budget, max_nodes=max_nodes, cancel=cancel, stats=stats)
     for _ in range(limit):
+        if budget.reached(len(forward_tree.all_nodes) + len(backward_tree.all_nodes)):
+            break
+
         # Grow both forward and backward by one
         for tree in [forward_tree, backward_tree]:
-            # Sample point
-            q_samp = bounds.sample()
+            if not enforce_cap(tree, goal if tree is forward_tree else start, node_cap):
+                continue
 
-            # Find nearest neighbor in tree
-            q_near = nearest_neighbor(q_samp,
-                                      tree.all_nodes,
-                                      key=lambda node: node.data)
+            if n > 1:
+                # Sample n points and pick the most promising one for reaching the other tree
+                other_tree = backward_tree if tree is forward_tree else forward_tree
+                q_samp, q_near = choose_sample(engine, tree, other_tree.all_nodes[-1].data, n, tree_weight=tree_weight, candidates=candidates)
+            else:
+                # Sample point
+                q_samp = engine.sample()
+
+                # Find nearest neighbor in tree
+                q_near = engine.nearest(tree, q_samp)
 
             # Compute new point
-            q_new = new_conf(q_near.data, q_samp, epsilon)
+            q_new = steer(q_near.data, q_samp, epsilon)
+            if q_new is None:
+                continue
 
             # Check collision and add to tree
-            if valid(q_new, bounds, obstacles):
+            if (engine.valid_edge(q_near.data, q_new) if check_edges else engine.valid(q_new)) and not crowded(engine, tree, q_new, min_spacing):
                 # Create new node in tree
-                new_node = TreeNode(parent=q_near,
-                                    data=q_new,
-                                    cost=(q_near.cost + epsilon))
-                q_near.children.append(new_node)
-                tree.all_nodes.append(new_node)
+                new_node = tree.add(q_near, q_new, cost=(q_near.cost + epsilon))
+                new_nodes.append((new_node, tree))
 
                 # Update visualization
-                if ax:
-                    ax.add_line(lines.Line2D(
-                        (q_near.data.coordinates['x'], q_new.coordinates['x']),
-                        (q_near.data.coordinates['y'], q_new.coordinates['y']),
-                        linewidth=1,
-                        color=f_color if tree is forward_tree else b_color))
+                if sink is not None:
+                    sink.add(q_near.data, q_new, f_color if tree is forward_tree else b_color)
 
         # Check if trees can be connected, return success
-        for f_node in forward_tree.all_nodes:
-            for b_node in backward_tree.all_nodes:
-                if b_node.data.dist(f_node.data) < epsilon:
-                    connect(f_node, b_node)
-                    return (forward_tree, backward_tree), goal_node
+        bridge = find_connection(new_nodes, forward_tree, backward_tree, epsilon, base_engine, check_edges=check_edges)
+        if bridge:
+            connect(*bridge)
+            stopped([forward_tree, backward_tree], 'goal', engine, stats, sink)
+            return (forward_tree, backward_tree), goal_node
+        new_nodes.clear()
 
     # Return None if fail
+    stopped([forward_tree, backward_tree], budget.reason or 'limit', engine, stats, sink)
     return (forward_tree, backward_tree), None
+
+
+def rrt_multi_connect(start: Point, goal: Point, bounds: Space, epsilon: float, n=3, **kwargs):
+    """
+    Bidirectional semi-greedy RRT: RRT-connect where each tree picks the best of n samples for reaching the other tree.
+    :param start: Starting point
+    :param goal: Goal point
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum distance to move between points
+    :param n: Number of points sampled per tree and iteration
+    :param kwargs: Other arguments of rrt_connect (e.g. tree_weight, candidates, limit, obstacles)
+    :return: RRTs (forward, backward) and goal node if found (tree.stop_reason records why the planner stopped)
+    """
+    return rrt_connect(start, goal, bounds, epsilon, n=n, **kwargs)
+
+
+def rrt_star_radius(n_nodes: int, bounds: Space, max_radius: float):
+    """ Shrinking RRT* neighborhood radius for a tree of n_nodes in bounds, capped at max_radius """
+    d = bounds.dim
+    volume = 1.0
+    for low, high in bounds.bounds.values():
+        volume *= high - low
+    unit_ball = math.pi ** (d / 2) / math.gamma(d / 2 + 1)
+    gamma = 2 * (1 + 1 / d) ** (1 / d) * (volume / unit_ball) ** (1 / d)
+    return min(gamma * (math.log(n_nodes) / n_nodes) ** (1 / d), max_radius) if n_nodes > 1 else max_radius
+
+
+def rrt_star_iter(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, color='red', radius=None, time_budget=None, compact=None, backend='python', check_edges=False, max_nodes=None, cancel=None, stats=None, sink=None, sampler=None, nn_checks=None, min_spacing=None, node_cap=None, informed=False):
+    """
+    Anytime RRT* algorithm.
+    New nodes choose the cheapest parent among their neighbors, and neighbors are rewired through new nodes when
+    that lowers their cost. Yields the tree and goal node every time the best path improves.
+    :param start: Starting point
+    :param goal: Goal point
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum distance to move between points
+    :param limit: Number of iterations/nodes to be added
+    :param obstacles: Obstacles in configuration space
+    :param ax: Axes object for visualization (drawn with a LineCollectionSink unless sink is given)
+    :param color: Tree color
+    :param radius: Maximum neighborhood radius for choose-parent and rewiring (default 2 * epsilon)
+    :param time_budget: Time in seconds after which to stop improving (None for no limit)
+    :param compact: Store the tree in contiguous arrays (CompactTree; None for the backend's default)
+    :param backend: Planner backend ('python' or 'numpy')
+    :param check_edges: Reject edges intersecting an obstacle (exact segment tests), not only end points
+    :param max_nodes: Number of tree nodes after which to stop (None for no limit)
+    :param cancel: CancellationToken to stop the planner early
+    :param stats: PlannerStats collecting per-phase timers and counters (None to disable instrumentation)
+    :param sink: EdgeSink receiving every edge added to the tree(s) (None to drop edges)
+    :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+    :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None);
+                      worthwhile in high dimensions
+    :param min_spacing: Reject new nodes closer than this to an existing node of their tree (None to accept all)
+    :param node_cap: Maximum number of nodes per tree, the least promising leaves are pruned to stay below it (None for no cap)
+    :param informed: Once a path is found, only sample where a shorter path can pass (ellipsoidal informed sampling)
+    :return: Generator of (RRT*, goal node), returning the final (RRT*, goal node) when exhausted (tree.stop_reason and
+             tree.solved are set once it is exhausted or closed)
+    """
+
+    # Ensure start and end have same dimension
+    if start.dim != goal.dim:
+        raise ValueError('Start point dimension ({}) and goal point dimension ({}) are must be equal'.format(start.dim, goal.dim))
+    check_sparsity(epsilon, min_spacing, node_cap, compact, backend)
+
+    max_radius = radius if radius is not None else 2 * epsilon
+
+    # Initialize RRT*
+    engine = make_backend(backend, bounds, obstacles=obstacles, compact=compact, sampler=sampler, nn_checks=nn_checks)
+    sink = edge_sink(sink, ax)
+    steer = new_conf
+    if stats is not None:
+        engine, steer = stats.wrap(engine), stats.timed('steer', new_conf)
+    tree = engine.tree(start)
+    goal_node = None
+    best_cost = math.inf
+
+    # Iterate until limit or budget reached. The stop reason is recorded once the generator finishes,
+    # or is closed after a path (e.g. by rrt_star returning the first path)
+    budget = Budget(time_budget=time_budget, max_nodes=max_nodes, cancel=cancel, stats=stats)
+    reason = 'goal'
+    try:
+        for _ in range(limit):
+            if budget.reached(len(tree.all_nodes)):
+                break
+            if not enforce_cap(tree, goal, node_cap, keep=goal_node):
+                continue
+
+            # Sample point
+            q_samp = engine.sample()
+
+            # Find nearest neighbor in tree
+            q_near = engine.nearest(tree, q_samp)
+
+            # Compute new point
+            q_new = steer(q_near.data, q_samp, epsilon)
+            if q_new is None:
+                continue
+
+            # Check collision
+            if not (engine.valid_edge(q_near.data, q_new) if check_edges else engine.valid(q_new)):
+                continue
+            if crowded(engine, tree, q_new, min_spacing):
+                continue
+
+            # Choose the cheapest parent among the neighbors
+            neighbors = engine.within(tree, q_new, rrt_star_radius(len(tree.all_nodes), bounds, max_radius))
+            parent, cost = q_near, q_near.cost + q_near.data.dist(q_new)
+            for node in neighbors:
+                node_cost = node.cost + node.data.dist(q_new)
+                if node_cost < cost and (not check_edges or engine.valid_edge(node.data, q_new)):
+                    parent, cost = node, node_cost
+            new_node = tree.add(parent, q_new, cost=cost)
+
+            # Rewire neighbors through the new node
+            for node in neighbors:
+                node_cost = cost + q_new.dist(node.data)
+                if node_cost < node.cost and (not check_edges or engine.valid_edge(q_new, node.data)):
+                    tree.reparent(node, new_node, node_cost)
+
+            # Update visualization
+            if sink is not None:
+                sink.add(parent.data, q_new, color)
+
+            # Add the goal, or move it under the new node if that is cheaper
+            if goal.dist(q_new) < epsilon and (not check_edges or engine.valid_edge(q_new, goal)):
+                goal_cost = cost + goal.dist(q_new)
+                if goal_node is None:
+                    goal_node = tree.add(new_node, goal, cost=goal_cost)
+                elif goal_cost < goal_node.cost:
+                    tree.reparent(goal_node, new_node, goal_cost)
+
+            # Report improvements, including those made by rewiring
+            if goal_node is not None and goal_node.cost < best_cost:
+                best_cost = goal_node.cost
+                if informed:
+                    engine.sampler.inform(start, goal, best_cost)
+                yield tree, goal_node
+
+        reason = budget.reason or 'limit'
+    finally:
+        stopped([tree], reason, engine, stats, sink, solved=goal_node is not None)
+
+    # Return the final tree and goal node (None if fail)
+    return tree, goal_node
+
+
+def rrt_star(start: Point, goal: Point, bounds: Space, epsilon: float, limit=5000, obstacles=None, ax=None, color='red', radius=None, anytime=False, time_budget=None, compact=None, backend='python', check_edges=False, max_nodes=None, cancel=None, stats=None, sink=None, sampler=None, nn_checks=None, min_spacing=None, node_cap=None, informed=False):
+    """
+    RRT* algorithm.
+    :param start: Starting point
+    :param goal: Goal point
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum distance to move between points
+    :param limit: Number of iterations/nodes to be added
+    :param obstacles: Obstacles in configuration space
+    :param ax: Axes object for visualization (drawn with a LineCollectionSink unless sink is given)
+    :param color: Tree color
+    :param radius: Maximum neighborhood radius for choose-parent and rewiring (default 2 * epsilon)
+    :param anytime: Keep improving the first path until limit or time_budget is reached
+    :param time_budget: Time in seconds after which to stop improving (None for no limit)
+    :param compact: Store the tree in contiguous arrays (CompactTree; None for the backend's default)
+    :param backend: Planner backend ('python' or 'numpy')
+    :param check_edges: Reject edges intersecting an obstacle (exact segment tests), not only end points
+    :param max_nodes: Number of tree nodes after which to stop (None for no limit)
+    :param cancel: CancellationToken to stop the planner early
+    :param stats: PlannerStats collecting per-phase timers and counters (None to disable instrumentation)
+    :param sink: EdgeSink receiving every edge added to the tree(s) (None to drop edges)
+    :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+    :param nn_checks: Approximate nearest neighbor search visiting at most this many KD-tree nodes (exact if None);
+                      worthwhile in high dimensions
+    :param min_spacing: Reject new nodes closer than this to an existing node of their tree (None to accept all)
+    :param node_cap: Maximum number of nodes per tree, the least promising leaves are pruned to stay below it (None for no cap)
+    :param informed: Once a path is found, only sample where a shorter path can pass (ellipsoidal informed sampling)
+    :return: RRT* and goal node if found (tree.stop_reason records why the planner stopped)
+    """
+    planner = rrt_star_iter(start, goal, bounds, epsilon, limit=limit, obstacles=obstacles, ax=ax, color=color,
+                            radius=radius, time_budget=time_budget, compact=compact, backend=backend,
+                            check_edges=check_edges, max_nodes=max_nodes, cancel=cancel, stats=stats, sink=sink, sampler=sampler, nn_checks=nn_checks,
+                            min_spacing=min_spacing, node_cap=node_cap, informed=informed)
+    try:
+        while True:
+            tree, goal_node = next(planner)
+            # Return the first path unless improving it
+            if not anytime:
+                planner.close()
+                return tree, goal_node
+    except StopIteration as stop:
+        return stop.value
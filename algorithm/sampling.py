@@ -0,0 +1,238 @@
+# sampling.py
+# Block-buffered, seedable sampling of configuration spaces
+
+import math
+import random
+
+import numpy as np
+
+from structs.cartesian import Point, Space
+
+PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97)
+
+
+def make_rng(seed=None):
+    """
+    Construct a NumPy Generator
+    :param seed: Generator (returned as is), int or str seed, or None to seed from the global random state
+    :return: NumPy Generator
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if seed is None:
+        return np.random.default_rng(random.getrandbits(64))
+    # Strings are hashed by random.Random, so trial seeds like '7/3/basic' are stable across processes
+    return np.random.default_rng(random.Random(seed).getrandbits(64))
+
+
+def halton(start: int, n: int, dim: int):
+    """
+    Points of the Halton sequence in the unit cube
+    :param start: Index of the first point
+    :param n: Number of points
+    :param dim: Dimension (at most len(PRIMES))
+    :return: Array of shape (n, dim)
+    """
+    if dim > len(PRIMES):
+        raise ValueError('Halton sequences support at most {} dimensions ({} given)'.format(len(PRIMES), dim))
+    indices = np.arange(start, start + n, dtype=np.int64)
+    out = np.zeros((n, dim))
+    for k in range(dim):
+        base = PRIMES[k]
+        i = indices.copy()
+        f = 1.0
+        while i.any():
+            f /= base
+            out[:, k] += f * (i % base)
+            i //= base
+    return out
+
+
+def prolate_spheroid(a, b, cost: float):
+    """
+    Returns the affine map of the unit ball onto the prolate hyperspheroid of points whose distances to a and b sum to
+    at most cost: the region holding every path from a to b shorter than cost (informed sampling, Gammell et al.)
+    :param a: Focus, array of shape (dim,)
+    :param b: Focus, array of shape (dim,)
+    :param cost: Path cost (at least the distance between the foci)
+    :return: (center, transform) such that center + transform @ x lies in the spheroid for x in the unit ball
+    """
+    c_min = float(np.linalg.norm(b - a))
+    dim = len(a)
+    radii = np.full(dim, math.sqrt(max(cost * cost - c_min * c_min, 0.0)) / 2)
+    radii[0] = cost / 2
+    if c_min == 0:
+        return (a + b) / 2, np.diag(radii)
+
+    # Rotation taking the first axis onto the direction between the foci
+    u, _, vt = np.linalg.svd(np.outer((b - a) / c_min, np.eye(dim)[0]))
+    signs = np.ones(dim)
+    signs[-1] = np.linalg.det(u) * np.linalg.det(vt)
+    rotation = u @ np.diag(signs) @ vt
+    return (a + b) / 2, rotation * radii
+
+
+class Sampler:
+    """
+    Sampler handing out points of a Space from pre-generated blocks.
+    Each sampler owns its random stream, so runs can be reproduced and run in parallel without sharing global state.
+    """
+
+    SEQUENCES = ('uniform', 'halton', 'sobol')
+    WINDOW = 64
+
+    def __init__(self, bounds: Space, seed=None, sequence='uniform', goal=None, goal_bias=0.0, block=4096):
+        """
+        :param bounds: Space to sample
+        :param seed: NumPy Generator, int or str seed (seeded from the global random state if None)
+        :param sequence: 'uniform' (pseudo-random), 'halton' or 'sobol' (quasi-random, requires scipy)
+        :param goal: Goal point returned instead of a sample with probability goal_bias
+        :param goal_bias: Probability of returning the goal
+        :param block: Number of samples generated at a time
+        """
+        self.check_sequence(sequence)
+        if goal_bias and goal is None:
+            raise ValueError('A goal is required for goal_bias ({})'.format(goal_bias))
+        self.bounds = bounds
+        self.axes = bounds.axes
+        self.low = np.array([bounds.bounds[c][0] for c in self.axes], dtype=float)
+        self.high = np.array([bounds.bounds[c][1] for c in self.axes], dtype=float)
+        self.rng = make_rng(seed)
+        self.sequence = sequence
+        self.goal = Point.from_values(self.axes, [goal.coordinates[c] for c in self.axes]) if goal is not None else None
+        self.goal_bias = goal_bias
+        self.block = block
+
+        self.points = []
+        self.rows = None
+        self.cursor = 0
+        self.generated = 0
+        self.engine = None
+        self.spheroid = None
+        # Random shift of quasi-random sequences (Cranley-Patterson rotation), so seeds give different streams
+        self.shift = self.rng.random(len(self.axes))
+        if sequence == 'sobol':
+            from scipy.stats import qmc
+            self.engine = qmc.Sobol(d=len(self.axes), scramble=True, seed=self.rng)
+
+    @classmethod
+    def check_sequence(cls, sequence: str):
+        """
+        Check that a sequence is known and its optional dependency is installed, e.g. before submitting jobs
+        :param sequence: Sequence name
+        :raise ValueError: If the sequence is unknown
+        :raise ImportError: If the sequence is 'sobol' and SciPy is not installed
+        """
+        if sequence not in cls.SEQUENCES:
+            raise ValueError('Unknown sequence {} (expected one of {})'.format(sequence, ', '.join(cls.SEQUENCES)))
+        if sequence == 'sobol':
+            from scipy.stats import qmc
+
+    def unit(self, n: int):
+        """ Returns the next n points of the sequence in the unit cube """
+        dim = len(self.axes)
+        if self.sequence == 'uniform':
+            return self.rng.random((n, dim))
+        if self.sequence == 'halton':
+            # Skip the origin (index 0)
+            u = halton(self.generated + 1, n, dim)
+            return (u + self.shift) % 1.0
+        return self.engine.random(n)
+
+    def values(self, n: int):
+        """
+        Returns an array of n sampled coordinate rows (in bounds axis order), bypassing the block buffer and goal bias
+        :param n: Number of samples
+        :return: Array of shape (n, dim)
+        """
+        if self.spheroid is not None:
+            return self.informed_values(n)
+        u = self.unit(n)
+        self.generated += n
+        return self.low + u * (self.high - self.low)
+
+    def inform(self, start: Point, goal: Point, cost: float):
+        """
+        Restrict sampling to the points that can lie on a path from start to goal shorter than cost
+        (a prolate hyperspheroid intersected with the bounds). Buffered samples are discarded.
+        Informed samples are always pseudo-random.
+        :param start: Starting point
+        :param goal: Goal point
+        :param cost: Cost of the best path found so far (inf to sample the whole space again)
+        """
+        if math.isinf(cost):
+            self.spheroid = None
+        else:
+            a = np.array([start.coordinates[c] for c in self.axes], dtype=float)
+            b = np.array([goal.coordinates[c] for c in self.axes], dtype=float)
+            self.spheroid = prolate_spheroid(a, b, cost)
+        self.cursor = len(self.points)
+
+    def informed_values(self, n: int):
+        """ Returns n coordinate rows drawn uniformly from the informed spheroid within the bounds (by rejection) """
+        center, transform = self.spheroid
+        dim = len(self.axes)
+        found = []
+        count = 0
+        while count < n:
+            m = max(2 * (n - count), 64)
+            x = self.rng.standard_normal((m, dim))
+            x *= (self.rng.random(m) ** (1.0 / dim) / np.linalg.norm(x, axis=1))[:, None]
+            pts = center + x @ transform.T
+            pts = pts[np.all((self.low <= pts) & (pts <= self.high), axis=1)][:n - count]
+            found.append(pts)
+            count += len(pts)
+        self.generated += n
+        return np.concatenate(found)
+
+    def refill(self, n: int):
+        values = self.values(max(self.block, n))
+        if self.sequence != 'uniform':
+            # Planners consume samples with a stride (e.g. alternating between two trees), which would pick a
+            # correlated subsequence; shuffling within short windows keeps the coverage but breaks the correlation
+            keys = np.arange(len(values)) // self.WINDOW + self.rng.random(len(values))
+            values = values[np.argsort(keys)]
+
+        axes, from_values = self.axes, Point.from_values
+        self.points = [from_values(axes, row) for row in values.tolist()]
+        if self.goal_bias:
+            for i in np.flatnonzero(self.rng.random(len(self.points)) < self.goal_bias):
+                self.points[i] = self.goal
+                values[i] = self.goal.values
+        self.rows = values
+        self.cursor = 0
+
+    def sample(self, n=1):
+        """
+        Returns a sampled Point (if n==1) or a list of points (if n>1)
+        :param n: Number of samples
+        """
+        i = self.cursor
+        if n == 1 and i < len(self.points):
+            self.cursor = i + 1
+            return self.points[i]
+
+        if not n > 0:
+            raise ValueError('n ({}) must be > 0'.format(n))
+        if i + n > len(self.points):
+            self.refill(n)
+            i = 0
+        self.cursor = i + n
+        if n == 1:
+            return self.points[i]
+        return self.points[i:i + n]
+
+    def sample_values(self, n: int):
+        """
+        Same samples as sample(n), as an array of coordinate rows in bounds axis order (for vectorized scoring)
+        :param n: Number of samples
+        :return: Array of shape (n, dim)
+        """
+        if not n > 0:
+            raise ValueError('n ({}) must be > 0'.format(n))
+        i = self.cursor
+        if i + n > len(self.points):
+            self.refill(n)
+            i = 0
+        self.cursor = i + n
+        return self.rows[i:i + n]
@@ -0,0 +1,255 @@
+# scene.py
+# Seeded scenes: vectorized obstacle generation, scene hashes and an on-disk cache of scenes and collision indexes
+
+import hashlib
+import itertools
+import json
+import os
+import pickle
+
+import numpy as np
+
+from algorithm.collision import ObstacleGrid, OccupancyGrid, box_arrays
+from algorithm.sampling import make_rng
+from structs.cartesian import Point, Space
+
+FORMAT_VERSION = 1
+
+
+def boxes_hash(axes: tuple, bounds: Space, low, high, start=None, goal=None, tolerance=None):
+    """
+    Returns a hash identifying a scene given as obstacle corner arrays. Obstacles are sorted first, so the hash does not
+    depend on their order. With a tolerance, coordinates are rounded to multiples of it first, so scenes differing by
+    less than the tolerance (and not straddling a rounding boundary) share a hash.
+    :param axes: Axis order of the arrays
+    :param bounds: Bounds of the configuration space
+    :param low: Lower obstacle corners, array of shape (n, dim)
+    :param high: Upper obstacle corners, array of shape (n, dim)
+    :param start: Starting point (not part of the hash if None)
+    :param goal: Goal point (not part of the hash if None)
+    :param tolerance: Coordinate rounding step (exact coordinates if None)
+    :return: Hex digest
+    """
+    def rounded(values):
+        values = np.asarray(values, dtype=float)
+        # Adding 0.0 turns -0.0 into 0.0, so both give the same bytes
+        return (np.round(values / tolerance) if tolerance else values) + 0.0
+
+    def point(pt):
+        return rounded([pt.coordinates[c] for c in axes]).tolist() if pt is not None else None
+
+    boxes = rounded(np.hstack([np.asarray(low, dtype=float).reshape(-1, len(axes)), np.asarray(high, dtype=float).reshape(-1, len(axes))]))
+    boxes = boxes[np.lexsort(boxes.T[::-1])] if len(boxes) else boxes
+    digest = hashlib.sha1(json.dumps({
+        'axes': list(axes),
+        'bounds': rounded([bounds.bounds[c] for c in axes]).tolist(),
+        'start': point(start),
+        'goal': point(goal)
+    }).encode())
+    digest.update(np.ascontiguousarray(boxes).tobytes())
+    return digest.hexdigest()
+
+
+def scene_hash(bounds: Space, obstacles=None, start=None, goal=None, tolerance=None):
+    """
+    Returns a hash identifying a scene (see boxes_hash), equal to Scene.hash for the same scene
+    :param bounds: Bounds of the configuration space
+    :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+    :param start: Starting point (not part of the hash if None)
+    :param goal: Goal point (not part of the hash if None)
+    :param tolerance: Coordinate rounding step (exact coordinates if None)
+    :return: Hex digest
+    """
+    low, high = box_arrays(list(obstacles or []), bounds.axes)
+    return boxes_hash(bounds.axes, bounds, low, high, start=start, goal=goal, tolerance=tolerance)
+
+
+def generate_boxes(start: Point, goal: Point, n: int, size=1, bounds=None, rng=None, chunk=2 ** 22):
+    """
+    Generate random cubic obstacles that do not cover the corners of the start and goal regions.
+    Candidates are drawn and tested in whole blocks instead of one at a time.
+    :param start: Starting point
+    :param goal: Goal point
+    :param n: Number of obstacles
+    :param size: Side length of the obstacles (and of the start and goal regions)
+    :param bounds: Space in which obstacle corners are placed ((-10, 10) along every axis of start if None)
+    :param rng: NumPy Generator, int or str seed (see make_rng)
+    :param chunk: Maximum number of (candidate, corner, axis) comparisons per block, bounding memory use
+    :return: (low, high) arrays of shape (n, dim)
+    """
+    axes = start.axes
+    rng = make_rng(rng)
+    ranges = np.array([bounds.bounds[c] if bounds is not None else (-10, 10) for c in axes], dtype=float)
+    corners = np.array([[center.coordinates[c] + offset * size / 2 for c, offset in zip(axes, offsets)]
+                        for center in [start, goal]
+                        for offsets in itertools.product([-1, 1], repeat=len(axes))])
+
+    accepted = []
+    count = 0
+    while count < n:
+        m = min(max(2 * (n - count), 64), max(chunk // corners.size, 1))
+        low = rng.uniform(ranges[:, 0], ranges[:, 1], size=(m, len(axes)))
+        covered = ((low[:, None, :] <= corners) & (corners <= low[:, None, :] + size)).all(axis=2).any(axis=1)
+        low = low[~covered][:n - count]
+        accepted.append(low)
+        count += len(low)
+    low = np.concatenate(accepted) if accepted else np.empty((0, len(axes)))
+    return low, low + size
+
+
+class Scene:
+    """
+    Bounds, start, goal and obstacles of a planning problem.
+    Obstacles are kept as (low, high) corner arrays; the Space objects the planners use are built on first access.
+    """
+
+    def __init__(self, bounds: Space, start: Point, goal: Point, low, high, seed=None):
+        """
+        :param bounds: Bounds of the configuration space
+        :param start: Starting point
+        :param goal: Goal point
+        :param low: Lower obstacle corners, array of shape (n, dim) in the axis order of bounds
+        :param high: Upper obstacle corners, array of shape (n, dim)
+        :param seed: Seed the scene was generated from (None if unknown)
+        """
+        self.bounds = bounds
+        self.axes = bounds.axes
+        self.start = start
+        self.goal = goal
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+        self.seed = seed
+        self._obstacles = None
+        self._hash = None
+
+    def __len__(self):
+        return len(self.low)
+
+    @classmethod
+    def generate(cls, bounds: Space, start: Point, goal: Point, n: int, size=1, seed=None):
+        """
+        Generate a scene with random obstacles (see generate_boxes)
+        :param bounds: Bounds of the configuration space (obstacle corners are placed within them)
+        :param start: Starting point
+        :param goal: Goal point
+        :param n: Number of obstacles
+        :param size: Side length of the obstacles
+        :param seed: int or str seed (the same seed always gives the same scene)
+        :return: Scene
+        """
+        start_values = Point.from_values(bounds.axes, [start.coordinates[c] for c in bounds.axes])
+        goal_values = Point.from_values(bounds.axes, [goal.coordinates[c] for c in bounds.axes])
+        low, high = generate_boxes(start_values, goal_values, n, size=size, bounds=bounds, rng=seed)
+        return cls(bounds, start, goal, low, high, seed=seed)
+
+    @property
+    def obstacles(self):
+        """ List of obstacles (Spaces) """
+        if self._obstacles is None:
+            self._obstacles = [Space(**dict(zip(self.axes, zip(lo, hi)))) for lo, hi in zip(self.low.tolist(), self.high.tolist())]
+        return self._obstacles
+
+    @property
+    def hash(self):
+        """ Hash of the scene's content (equal to scene_hash of its obstacles), computed without building Spaces """
+        if self._hash is None:
+            self._hash = boxes_hash(self.axes, self.bounds, self.low, self.high, start=self.start, goal=self.goal)
+        return self._hash
+
+    def index(self, occupancy=None, max_clearance=None):
+        """
+        Build a collision index over the obstacles
+        :param occupancy: Cell size of an OccupancyGrid (an ObstacleGrid if None)
+        :param max_clearance: Cap of the OccupancyGrid's distance field (None for no cap)
+        :return: ObstacleIndex
+        """
+        if occupancy:
+            return OccupancyGrid(self.obstacles, self.bounds, resolution=occupancy, max_clearance=max_clearance)
+        return ObstacleGrid(self.obstacles)
+
+    def save(self, path: str):
+        """ Save the scene to a .npz file """
+        meta = {
+            'version': FORMAT_VERSION,
+            'axes': list(self.axes),
+            'bounds': self.bounds.bounds,
+            'start': self.start.coordinates,
+            'goal': self.goal.coordinates,
+            'seed': self.seed
+        }
+        # Write to a temporary file first so concurrent readers never see a partial scene
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as out_file:
+            np.savez(out_file, low=self.low, high=self.high, meta=np.array(json.dumps(meta)))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """ Load a scene saved with save() """
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != FORMAT_VERSION:
+                raise ValueError('Unsupported scene format version {} in {}'.format(meta.get('version'), path))
+            low, high = data['low'], data['high']
+        bounds = Space(**{axis: tuple(meta['bounds'][axis]) for axis in meta['axes']})
+        return cls(bounds, Point(**meta['start']), Point(**meta['goal']), low, high, seed=meta['seed'])
+
+
+class SceneCache:
+    """
+    Directory of generated scenes and their collision indexes, so they can be shared and replayed across
+    planners, runs and processes. Scenes are looked up by their generation parameters.
+    Indexes are stored as pickles: only use cache directories you trust.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory: Cache directory (created if needed)
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(bounds: Space, start: Point, goal: Point, n: int, size, seed):
+        """ Returns the key of a scene's generation parameters """
+        spec = {
+            'version': FORMAT_VERSION,
+            'bounds': bounds.bounds,
+            'start': start.coordinates,
+            'goal': goal.coordinates,
+            'n': n,
+            'size': size,
+            'seed': seed
+        }
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+    def scene(self, bounds: Space, start: Point, goal: Point, n: int, size=1, seed=None):
+        """
+        Load a scene from the cache, generating and storing it if missing (see Scene.generate)
+        :return: Scene
+        """
+        if seed is None:
+            raise ValueError('Cached scenes require a seed')
+        path = os.path.join(self.directory, 'scene-{}.npz'.format(self.key(bounds, start, goal, n, size, seed)))
+        if os.path.isfile(path):
+            return Scene.load(path)
+        scene = Scene.generate(bounds, start, goal, n, size=size, seed=seed)
+        scene.save(path)
+        return scene
+
+    def index(self, scene: Scene, occupancy=None, max_clearance=None):
+        """
+        Load the collision index of a scene from the cache, building and storing it if missing (see Scene.index)
+        :return: ObstacleIndex
+        """
+        kind = 'occupancy-{}-{}'.format(occupancy, max_clearance) if occupancy else 'grid'
+        path = os.path.join(self.directory, 'index-{}-{}.pkl'.format(scene.hash, kind))
+        if os.path.isfile(path):
+            with open(path, 'rb') as in_file:
+                return pickle.load(in_file)
+        index = scene.index(occupancy=occupancy, max_clearance=max_clearance)
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as out_file:
+            pickle.dump(index, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        return index
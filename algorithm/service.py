@@ -0,0 +1,329 @@
+# service.py
+# Asyncio planning service: worker pool offloading, progress streaming, cancellation, coalescing and result caching
+
+import asyncio
+import json
+import multiprocessing
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from algorithm.profiling import PlannerStats
+from algorithm.rrt import rrt, rrt_connect, rrt_multi, rrt_multi_connect, rrt_star_iter
+from algorithm.sampling import Sampler
+from algorithm.scene import scene_hash
+from algorithm.termination import CancellationToken
+from structs.cartesian import *
+from structs.tree import traceback
+
+PLANNERS = {
+    'basic': rrt,
+    'connect': rrt_connect,
+    'multi': rrt_multi,
+    'multi-connect': rrt_multi_connect,
+    'star': rrt_star_iter
+}
+
+# Number of planner iterations between checks of the cancellation event, which is a manager proxy in worker processes
+CANCEL_EVERY = 64
+
+
+def plan_job(algorithm: str, start: Point, goal: Point, bounds: Space, epsilon: float, limit: int, obstacles, seed, options: dict,
+             progress=None, cancel_event=None, every=1000):
+    """
+    Run a planner in a worker, posting progress events. Module-level so process pools can pickle it.
+    :param algorithm: Planner name (key of PLANNERS)
+    :param start: Starting point
+    :param goal: Goal point
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum distance to move between points
+    :param limit: Number of iterations/nodes to be added
+    :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+    :param seed: Seed of the sampler
+    :param options: Extra keyword arguments for the planner (anytime for 'star')
+    :param progress: Queue receiving progress event dictionaries, then None once the run finished (None to disable)
+    :param cancel_event: Event-like object stopping the planner once set (None if the run cannot be cancelled)
+    :param every: Number of iterations between node count events
+    :return: Dictionary of the path (list of points, None if no path was found), its cost, the number of nodes and
+             the stop reason
+    """
+    try:
+        options = dict(options)
+        anytime = options.pop('anytime', False)
+        sampler = Sampler(bounds, seed=seed, goal=goal, goal_bias=options.pop('goal_bias', 0.0))
+        cancel = CancellationToken(cancel_event, every=CANCEL_EVERY) if cancel_event is not None else None
+        stats = None
+        if progress is not None:
+            stats = PlannerStats(callback=lambda s, n_nodes: progress.put({'nodes': n_nodes, 'iterations': s.counters['iterations']}),
+                                 every=every)
+
+        planner = PLANNERS[algorithm](start, goal, bounds, epsilon, limit=limit, obstacles=obstacles, cancel=cancel, stats=stats,
+                                      sampler=sampler, **options)
+        if algorithm == 'star':
+            # Stream every improvement of the best path
+            trees, goal_node = None, None
+            try:
+                while True:
+                    trees, goal_node = next(planner)
+                    if progress is not None:
+                        progress.put({'nodes': len(trees.all_nodes), 'cost': goal_node.cost})
+                    if not anytime:
+                        planner.close()
+                        break
+            except StopIteration as stop:
+                trees, goal_node = stop.value
+        else:
+            trees, goal_node = planner
+
+        trees = trees if isinstance(trees, tuple) else (trees,)
+        path, cost = None, None
+        if goal_node:
+            trace, cost = traceback(goal_node)
+            path = [node.data for node in trace]
+        return {
+            'path': path,
+            'cost': cost,
+            'nodes': sum(len(tree.all_nodes) for tree in trees),
+            'stop': trees[0].stop_reason
+        }
+    finally:
+        if progress is not None:
+            progress.put(None)
+
+
+class PlanRequest:
+    """
+    Handle of one planning request. Identical requests share a single computation;
+    events(), result() and cancel() only concern this handle.
+    """
+
+    def __init__(self, computation, cached=False):
+        self.computation = computation
+        self.cached = cached
+        self.cancelled = False
+        self.listeners = []
+        computation.handles.append(self)
+
+    def __await__(self):
+        return self.result().__await__()
+
+    async def result(self):
+        """
+        Wait for the planning result
+        :return: Result dictionary (see plan_job)
+        :raise asyncio.CancelledError: If this request was cancelled
+        """
+        if self.cancelled:
+            raise asyncio.CancelledError()
+        waiter = asyncio.ensure_future(asyncio.shield(self.computation.future))
+        self.computation.waiters.append((self, waiter))
+        return await waiter
+
+    async def events(self):
+        """ Asynchronous iterator over the progress events of the computation, starting with the latest one """
+        events = asyncio.Queue()
+        self.listeners.append(events)
+        if self.computation.latest is not None:
+            events.put_nowait(self.computation.latest)
+        if self.computation.future.done():
+            events.put_nowait(None)
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            yield event
+
+    def cancel(self):
+        """ Cancel this request. The shared computation is stopped once all of its requests are cancelled. """
+        if self.cancelled:
+            return
+        self.cancelled = True
+        for events in self.listeners:
+            events.put_nowait(None)
+        for handle, waiter in self.computation.waiters:
+            if handle is self:
+                waiter.cancel()
+        self.computation.release(self)
+
+
+class Computation:
+    """ A planning run shared by all requests coalesced into it """
+
+    def __init__(self, service, key: str, cancel_event):
+        self.service = service
+        self.key = key
+        self.cancel_event = cancel_event
+        self.future = asyncio.get_event_loop().create_future()
+        self.handles = []
+        self.waiters = []
+        self.latest = None
+
+    def publish(self, event):
+        self.latest = event if event is not None else self.latest
+        for handle in self.handles:
+            if not handle.cancelled:
+                for events in handle.listeners:
+                    events.put_nowait(event)
+
+    def release(self, handle):
+        if all(h.cancelled for h in self.handles) and not self.future.done():
+            self.cancel_event.set()
+            self.service.forget(self)
+
+
+class PlanningService:
+    """
+    Asyncio front-end to the planners.
+    Planning runs in a worker process pool (or a thread pool when local), progress is streamed back to the event loop,
+    identical requests in flight are coalesced into one computation and results of recent requests are kept in
+    an LRU cache keyed on the scene hash.
+    Use as an async context manager, or call close() when done.
+    """
+
+    def __init__(self, workers=1, local=False, cache_size=128, tolerance=None, every=1000, poll=0.05):
+        """
+        :param workers: Number of worker processes (threads if local)
+        :param local: Plan in threads of this process instead of worker processes (e.g. for testing)
+        :param cache_size: Number of results kept in the LRU cache (0 to disable caching)
+        :param tolerance: Requests whose coordinates round to the same multiples of tolerance are coalesced and
+                          share cached results (exact matches only if None)
+        :param every: Number of planner iterations between node count events
+        :param poll: Interval in seconds at which progress events are collected
+        """
+        self.local = local
+        self.cache_size = cache_size
+        self.tolerance = tolerance
+        self.every = every
+        self.poll = poll
+        self.cache = OrderedDict()
+        self.running = dict()
+        if local:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+            self.manager = None
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+            self.manager = multiprocessing.Manager()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Cancel all running computations and shut the workers down """
+        for computation in list(self.running.values()):
+            computation.cancel_event.set()
+        self.executor.shutdown(wait=True)
+        if self.manager is not None:
+            self.manager.shutdown()
+
+    def key(self, algorithm: str, start: Point, goal: Point, bounds: Space, epsilon: float, limit: int, obstacles, options: dict):
+        """ Returns the key identifying a request: its scene hash and planner parameters """
+        scene = scene_hash(bounds, obstacles, start, goal, tolerance=self.tolerance)
+        return '{}/{}/{}/{}/{}'.format(scene, algorithm, epsilon, limit, json.dumps(options, sort_keys=True, default=repr))
+
+    def submit(self, start: Point, goal: Point, bounds: Space, epsilon: float, obstacles=None, algorithm='connect', limit=5000,
+               seed=None, **options):
+        """
+        Submit a planning request (from within the event loop)
+        :param start: Starting point
+        :param goal: Goal point
+        :param bounds: Bounds of the configuration space
+        :param epsilon: Maximum distance to move between points
+        :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+        :param algorithm: Planner name (key of PLANNERS)
+        :param limit: Number of iterations/nodes to be added
+        :param seed: Seed of the run (derived from the request key if None, so cached and fresh results agree)
+        :param options: Extra keyword arguments for the planner (e.g. time_budget, check_edges, anytime for 'star')
+        :return: PlanRequest
+        """
+        if algorithm not in PLANNERS:
+            raise ValueError('Unknown algorithm \'{}\' (expected one of {})'.format(algorithm, ', '.join(PLANNERS)))
+        key = self.key(algorithm, start, goal, bounds, epsilon, limit, obstacles, dict(options, seed=seed))
+
+        # Recent results are returned without planning
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            computation = Computation(self, key, None)
+            computation.future.set_result(self.cache[key])
+            return PlanRequest(computation, cached=True)
+
+        # Identical requests in flight share their computation
+        if key in self.running:
+            return PlanRequest(self.running[key])
+
+        if self.manager is not None:
+            progress, cancel_event = self.manager.Queue(), self.manager.Event()
+        else:
+            progress, cancel_event = queue.Queue(), threading.Event()
+        computation = Computation(self, key, cancel_event)
+        self.running[key] = computation
+        request = PlanRequest(computation)
+
+        args = (algorithm, start, goal, bounds, epsilon, limit, obstacles, seed if seed is not None else key, options,
+                progress, cancel_event, self.every)
+        job = asyncio.wrap_future(self.executor.submit(plan_job, *args))
+        asyncio.ensure_future(self.collect(computation, job, progress))
+        return request
+
+    async def plan(self, start: Point, goal: Point, bounds: Space, epsilon: float, obstacles=None, algorithm='connect', limit=5000,
+                   seed=None, progress=None, **options):
+        """
+        Plan a path, see submit()
+        :param progress: Function called with every progress event (None to ignore them)
+        :return: Result dictionary (see plan_job)
+        """
+        request = self.submit(start, goal, bounds, epsilon, obstacles=obstacles, algorithm=algorithm, limit=limit, seed=seed, **options)
+        if progress is not None:
+            async def forward():
+                async for event in request.events():
+                    progress(event)
+            forwarding = asyncio.ensure_future(forward())
+            try:
+                return await request.result()
+            finally:
+                await forwarding
+        return await request.result()
+
+    async def collect(self, computation: Computation, job, progress):
+        """ Forward the progress events of a computation until it finishes, then publish and cache its result """
+        finished = False
+        while not finished:
+            # Drain the queue, waiting a little between polls
+            while True:
+                try:
+                    event = progress.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    finished = True
+                    break
+                computation.publish(event)
+            if not finished:
+                if job.done() and job.exception() is not None:
+                    break
+                await asyncio.sleep(self.poll)
+
+        try:
+            result = await job
+        except Exception as e:
+            if not computation.future.done():
+                computation.future.set_exception(e)
+        else:
+            if not computation.future.done():
+                computation.future.set_result(result)
+            if result['stop'] != 'cancelled' and self.cache_size:
+                self.cache[computation.key] = result
+                self.cache.move_to_end(computation.key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        finally:
+            computation.publish(None)
+            self.forget(computation)
+
+    def forget(self, computation: Computation):
+        """ Stop coalescing new requests into a computation """
+        if self.running.get(computation.key) is computation:
+            del self.running[computation.key]
@@ -0,0 +1,257 @@
+# session.py
+# Reusable planning session answering repeated queries over a shared roadmap tree
+
+import math
+
+import numpy as np
+
+from algorithm.backend import PythonBackend
+from algorithm.collision import *
+from algorithm.rrt import new_conf
+from algorithm.sampling import Sampler
+from algorithm.termination import *
+from structs.cartesian import *
+from structs.tree import *
+
+
+class PlannerSession:
+    """
+    Multi-query planner over a fixed configuration space.
+    The RRT roadmap and its spatial index are kept between queries: each query connects its start and goal to the
+    existing roadmap and only grows it when one of them cannot be reached yet. Adding an obstacle only removes the
+    nodes (and subtrees) it invalidates; removing an obstacle keeps the roadmap as is.
+    """
+
+    tree = None
+    stop_reason = None
+
+    def __init__(self, bounds: Space, epsilon: float, obstacles=None, root=None, goal_bias=0.05, sampler=None):
+        """
+        :param bounds: Bounds of the configuration space
+        :param epsilon: Maximum distance to move between points (and to connect a query point to the roadmap)
+        :param obstacles: Obstacles in configuration space
+        :param root: Root of the roadmap (the start of the first query if None)
+        :param goal_bias: Probability of steering towards an unconnected query point instead of a random sample
+        :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+        """
+        self.bounds = bounds
+        self.epsilon = epsilon
+        self.goal_bias = goal_bias
+        self.obstacles = list(obstacles) if obstacles else []
+        self.sampler = sampler if sampler is not None else Sampler(bounds)
+        self.engine = PythonBackend(bounds, self.obstacles, sampler=self.sampler)
+        self.tree = self.engine.tree(root) if root is not None else None
+        self.queries = 0
+
+    def __len__(self):
+        return len(self.tree.all_nodes) if self.tree else 0
+
+    def add_obstacle(self, obstacle: Space):
+        """
+        Add an obstacle and remove the roadmap nodes it invalidates (together with their subtrees)
+        :param obstacle: Obstacle to add
+        :return: Number of removed nodes
+        """
+        self.obstacles.append(obstacle)
+        self.engine = PythonBackend(self.bounds, self.obstacles, sampler=self.sampler)
+        if self.tree is None:
+            return 0
+
+        # Edges are at most epsilon long, so an invalidated edge has an end point within epsilon of the obstacle
+        center = Point(**{axis: (low + high) / 2 for axis, (low, high) in obstacle.bounds.items()})
+        radius = math.sqrt(sum((high - low) ** 2 for low, high in obstacle.bounds.values())) / 2 + self.epsilon
+        hit = [node for node in self.tree.index.within(center, radius) if self.invalidated(node, obstacle)]
+
+        if any(node is self.tree.root for node in hit):
+            removed = len(self.tree.all_nodes)
+            self.tree = None
+            return removed
+        return len(self.tree.prune(hit))
+
+    def remove_obstacle(self, obstacle: Space):
+        """
+        Remove an obstacle. Existing roadmap nodes stay valid; new queries may use the freed space.
+        :param obstacle: Obstacle to remove (the same object previously given)
+        """
+        for i, existing in enumerate(self.obstacles):
+            if existing is obstacle:
+                del self.obstacles[i]
+                break
+        else:
+            raise ValueError('Obstacle {} is not part of the session'.format(obstacle))
+        self.engine = PythonBackend(self.bounds, self.obstacles, sampler=self.sampler)
+
+    def invalidated(self, node: TreeNode, obstacle: Space):
+        """
+        Test whether an obstacle collides with a node or with the edge to its parent
+        :param node: Roadmap node
+        :param obstacle: Obstacle
+        :return: True if the node must be removed
+        """
+        if obstacle.within(node.data):
+            return True
+        if node.parent is None:
+            return False
+        low, high = box_arrays([obstacle], node.data.axes)
+        return bool(segment_hits_boxes(np.array(node.data.values), np.array(node.data.aligned(node.parent.data)), low, high).any())
+
+    def valid_edge(self, a: Point, b: Point):
+        return self.engine.valid_edge(a, b)
+
+    def attach(self, pt: Point):
+        """
+        Find the closest roadmap node a point can be connected to with a collision-free edge
+        :param pt: Query point
+        :return: Roadmap node, or None if the point cannot be connected yet
+        """
+        candidates = self.engine.within(self.tree, pt, self.epsilon)
+        candidates.sort(key=lambda node: node.data.dist(pt))
+        for node in candidates:
+            if self.valid_edge(node.data, pt):
+                return node
+        return None
+
+    def query(self, start: Point, goal: Point, limit=5000, time_budget=None, max_nodes=None, cancel=None):
+        """
+        Find a path between two points, reusing and growing the roadmap
+        :param start: Starting point
+        :param goal: Goal point
+        :param limit: Maximum number of growth iterations for this query
+        :param time_budget: Time in seconds after which to stop growing (None for no limit)
+        :param max_nodes: Roadmap size after which to stop growing (None for no limit)
+        :param cancel: CancellationToken to stop the query early
+        :return: Goal node of the path (use traceback), or None (stop_reason records why)
+        """
+        return self.query_batch([(start, goal)], limit=limit, time_budget=time_budget, max_nodes=max_nodes, cancel=cancel)[0]
+
+    def query_batch(self, queries: list, limit=5000, time_budget=None, max_nodes=None, cancel=None):
+        """
+        Find paths for many start/goal pairs at once.
+        All queries share the roadmap, its sample stream and the obstacle index; every new roadmap node is tested
+        against all still unconnected query points with a single vectorized distance computation.
+        :param queries: List of (start, goal) pairs
+        :param limit: Maximum number of growth iterations for the whole batch
+        :param time_budget: Time in seconds after which to stop growing (None for no limit)
+        :param max_nodes: Roadmap size after which to stop growing (None for no limit)
+        :param cancel: CancellationToken to stop the batch early
+        :return: List with the goal node of each path (use traceback), or None where no path was found
+        """
+        for start, goal in queries:
+            if start.dim != goal.dim:
+                raise ValueError('Start point dimension ({}) and goal point dimension ({}) are must be equal'.format(start.dim, goal.dim))
+        self.queries += len(queries)
+
+        # Query points are numbered 2k (start) and 2k + 1 (goal); queries with an invalid end point are dropped
+        endpoints = [pt for query in queries for pt in query]
+        usable = [self.engine.valid(start) and self.engine.valid(goal) for start, goal in queries]
+        if self.tree is None and any(usable):
+            self.tree = self.engine.tree(queries[usable.index(True)][0])
+        attached = [self.attach(pt) if usable[i // 2] else None for i, pt in enumerate(endpoints)]
+        pending = [i for i, node in enumerate(attached) if node is None and usable[i // 2]]
+
+        # Grow the roadmap until all query points can be connected to it
+        budget = Budget(time_budget=time_budget, max_nodes=max_nodes, cancel=cancel)
+        reason = 'limit'
+        if pending:
+            root = self.tree.root.data
+            pending_coords = np.array([root.aligned(endpoints[i]) for i in pending])
+        for _ in range(limit):
+            if not pending:
+                break
+            if budget.reached(len(self.tree.all_nodes)):
+                reason = budget.reason
+                break
+
+            # Draw the goal bias from the sampler's generator, so a seeded sampler makes the session reproducible
+            if self.sampler.rng.random() < self.goal_bias:
+                q_samp = endpoints[pending[int(self.sampler.rng.integers(len(pending)))]]
+            else:
+                q_samp = self.engine.sample()
+            q_near = self.engine.nearest(self.tree, q_samp)
+            q_new = new_conf(q_near.data, q_samp, self.epsilon)
+            if q_new is None or not self.valid_edge(q_near.data, q_new):
+                continue
+            q_new_node = self.tree.add(q_near, q_new, cost=(q_near.cost + self.epsilon))
+
+            # Connect every pending query point within reach of the new node
+            offsets = pending_coords - root.aligned(q_new)
+            close = np.flatnonzero(np.einsum('ij,ij->i', offsets, offsets) < self.epsilon * self.epsilon)
+            connected = [j for j in close if self.valid_edge(q_new, endpoints[pending[j]])]
+            if connected:
+                for j in connected:
+                    attached[pending[j]] = q_new_node
+                pending = [i for j, i in enumerate(pending) if attached[i] is None]
+                pending_coords = np.delete(pending_coords, connected, axis=0)
+
+        results = []
+        for k, (start, goal) in enumerate(queries):
+            if attached[2 * k] is None or attached[2 * k + 1] is None:
+                results.append(None)
+            else:
+                results.append(path_nodes([start] + roadmap_path(attached[2 * k], attached[2 * k + 1]) + [goal]))
+        if all(result is not None for result in results):
+            self.stop_reason = 'goal'
+        else:
+            self.stop_reason = reason if pending else 'invalid'
+        return results
+
+
+def roadmap_path(a: TreeNode, b: TreeNode):
+    """
+    Points along the tree path between two nodes (through their closest common ancestor)
+    :param a: First node
+    :param b: Second node
+    :return: List of points from a to b
+    """
+    ancestors = dict()
+    node = a
+    while node is not None:
+        ancestors[id(node)] = len(ancestors)
+        node = node.parent
+
+    down = []
+    node = b
+    while id(node) not in ancestors:
+        down.append(node.data)
+        node = node.parent
+
+    up = []
+    depth = ancestors[id(node)]
+    node = a
+    for _ in range(depth + 1):
+        up.append(node.data)
+        node = node.parent
+    return up + down[::-1]
+
+
+def path_nodes(points: list):
+    """
+    Chain points into standalone tree nodes so the path can be read back with traceback
+    :param points: Points from start to goal
+    :return: Last (goal) node
+    """
+    node = TreeNode(data=points[0])
+    for pt in points[1:]:
+        # Skip duplicate points (query points lying exactly on roadmap nodes)
+        if pt.dist(node.data) == 0:
+            continue
+        node = TreeNode(parent=node, data=pt, cost=(node.cost + node.data.dist(pt)))
+    return node
+
+
+def plan_batch(queries: list, bounds: Space, epsilon: float, obstacles=None, limit=5000, time_budget=None, max_nodes=None, cancel=None, sampler=None):
+    """
+    Plan paths for many start/goal pairs in the same space with a shared roadmap (see PlannerSession.query_batch)
+    :param queries: List of (start, goal) pairs
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum distance to move between points
+    :param obstacles: Obstacles in configuration space
+    :param limit: Maximum number of growth iterations for the whole batch
+    :param time_budget: Time in seconds after which to stop (None for no limit)
+    :param max_nodes: Roadmap size after which to stop (None for no limit)
+    :param cancel: CancellationToken to stop the batch early
+    :param sampler: Sampler drawing the random points (uniform, seeded from the global random state if None)
+    :return: List with the goal node of each path (use traceback), or None where no path was found
+    """
+    session = PlannerSession(bounds, epsilon, obstacles, sampler=sampler)
+    return session.query_batch(queries, limit=limit, time_budget=time_budget, max_nodes=max_nodes, cancel=cancel)
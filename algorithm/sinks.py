@@ -0,0 +1,88 @@
+# sinks.py
+# Edge sinks receiving the tree edges added by planners
+
+import numpy as np
+
+from structs.cartesian import Point
+
+
+class EdgeSink:
+    """ Base edge sink, drops all edges """
+
+    def add(self, a: Point, b: Point, color=None):
+        """ Receive an edge from a to b """
+        pass
+
+    def flush(self):
+        """ Called when the planner stops (or reports a solution) """
+        pass
+
+
+class EdgeRecorder(EdgeSink):
+    """ Records edges, grouped by color, for later rendering """
+
+    def __init__(self):
+        self.edges = dict()
+
+    def add(self, a: Point, b: Point, color=None):
+        self.edges.setdefault(color, []).append((a.values, a.aligned(b)))
+
+    def segments(self, color=None):
+        """
+        Returns recorded edges as an array of shape (n, 2, dim)
+        :param color: Only return edges of this color (all edges if None)
+        """
+        if color is not None:
+            edges = self.edges.get(color, [])
+        else:
+            edges = [edge for color_edges in self.edges.values() for edge in color_edges]
+        if not edges:
+            return np.empty((0, 2, 0))
+        return np.array(edges, dtype=float)
+
+
+class LineCollectionSink(EdgeRecorder):
+    """
+    Batches edges and draws them on a matplotlib Axes as one LineCollection per color on flush.
+    Points are projected onto two of their axes (the first two if not given).
+    """
+
+    def __init__(self, ax, linewidth=1, axes=None):
+        """
+        :param ax: Axes object for visualization
+        :param linewidth: Line width
+        :param axes: Pair of axis names to draw (None for the first two axes of each point)
+        """
+        super().__init__()
+        self.ax = ax
+        self.linewidth = linewidth
+        self.axes = axes
+
+    def add(self, a: Point, b: Point, color=None):
+        if self.axes is None:
+            super().add(a, b, color)
+            return
+        a_coordinates, b_coordinates = a.coordinates, b.coordinates
+        self.edges.setdefault(color, []).append((tuple(a_coordinates[c] for c in self.axes),
+                                                 tuple(b_coordinates[c] for c in self.axes)))
+
+    def flush(self):
+        from matplotlib.collections import LineCollection
+
+        for color in list(self.edges):
+            self.ax.add_collection(LineCollection(self.segments(color)[:, :, :2], linewidths=self.linewidth, colors=color))
+        self.edges.clear()
+
+
+def edge_sink(sink=None, ax=None):
+    """
+    Returns the edge sink a planner should use
+    :param sink: EdgeSink (takes precedence over ax)
+    :param ax: Axes object for visualization, drawn with a LineCollectionSink
+    :return: EdgeSink, or None to drop edges
+    """
+    if sink is not None:
+        return sink
+    if ax is not None:
+        return LineCollectionSink(ax)
+    return None
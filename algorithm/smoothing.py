@@ -0,0 +1,136 @@
+# smoothing.py
+# Path post-processing: shortcutting and corner smoothing
+
+import random
+
+from algorithm.collision import obstacle_index, valid_edge
+from structs.cartesian import *
+
+
+class SegmentCache:
+    """
+    Memoized segment validity queries. Shortcutting tests the same pairs of path points many times,
+    so every result is kept (segments are undirected, both orders share an entry).
+    """
+
+    def __init__(self, bounds: Space, obstacles=None):
+        """
+        :param bounds: Bounds of the configuration space
+        :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+        """
+        self.bounds = bounds
+        self.obstacles = obstacle_index(obstacles)
+        self.results = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.results)
+
+    def valid(self, a: Point, b: Point):
+        """ Returns True if the straight segment between two valid points is collision free """
+        u, v = a.values, a.aligned(b)
+        key = (u, v) if u <= v else (v, u)
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+            result = self.results[key] = valid_edge(a, b, self.bounds, self.obstacles)
+        else:
+            self.hits += 1
+        return result
+
+
+def path_cost(points: list):
+    """ Returns the length of a path """
+    return sum(a.dist(b) for a, b in zip(points, points[1:]))
+
+
+def random_shortcut(points: list, cache: SegmentCache, attempts=100, rng=None):
+    """
+    Randomized shortcutting: repeatedly pick two path points and drop everything between them if they see each other
+    :param points: Path points from start to goal
+    :param cache: SegmentCache of the scene
+    :param attempts: Number of shortcut attempts
+    :param rng: random.Random instance (the global random state if None)
+    :return: New list of path points
+    """
+    rng = rng or random
+    points = list(points)
+    for _ in range(attempts):
+        if len(points) < 3:
+            break
+        i, j = sorted(rng.sample(range(len(points)), 2))
+        if j - i > 1 and cache.valid(points[i], points[j]):
+            del points[i + 1:j]
+    return points
+
+
+def greedy_shortcut(points: list, cache: SegmentCache):
+    """
+    Line-of-sight shortcutting: from each kept point, jump to the farthest later path point in sight
+    :param points: Path points from start to goal
+    :param cache: SegmentCache of the scene
+    :return: New list of path points
+    """
+    if len(points) < 3:
+        return list(points)
+    result = [points[0]]
+    i = 0
+    while i < len(points) - 1:
+        j = len(points) - 1
+        while j > i + 1 and not cache.valid(points[i], points[j]):
+            j -= 1
+        result.append(points[j])
+        i = j
+    return result
+
+
+def smooth(points: list, cache: SegmentCache, iterations=3, ratio=0.25):
+    """
+    Corner cutting (Chaikin): every corner is replaced by two points on its adjacent segments if the cut is collision free.
+    The new points lie on valid segments, so only the cut itself needs to be tested and the path never gets longer.
+    :param points: Path points from start to goal
+    :param cache: SegmentCache of the scene
+    :param iterations: Number of smoothing passes
+    :param ratio: Fraction of each adjacent segment cut off (0 < ratio <= 0.5)
+    :return: New list of path points
+    """
+    if not 0 < ratio <= 0.5:
+        raise ValueError('Corner cutting ratio ({}) must be in (0, 0.5]'.format(ratio))
+    for _ in range(iterations):
+        if len(points) < 3:
+            break
+        result = [points[0]]
+        for prev, corner, succ in zip(points, points[1:], points[2:]):
+            p = corner + (prev - corner) * ratio
+            q = corner + (succ - corner) * ratio
+            if cache.valid(p, q):
+                result.append(p)
+                result.append(q)
+            else:
+                result.append(corner)
+        result.append(points[-1])
+        points = result
+    return points
+
+
+def optimize_path(points: list, bounds: Space, obstacles=None, attempts=100, iterations=3, rng=None, cache=None):
+    """
+    Shorten a planned path: randomized shortcutting, line-of-sight shortcutting, then corner smoothing.
+    Every new segment is tested exactly; kept parts of the raw path are only as valid as its edges
+    (planners only test end points unless run with check_edges).
+    :param points: Path points from start to goal (e.g. [node.data for node in traceback(goal_node)[0]])
+    :param bounds: Bounds of the configuration space
+    :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+    :param attempts: Number of randomized shortcut attempts
+    :param iterations: Number of smoothing passes
+    :param rng: random.Random instance for the randomized shortcuts (the global random state if None)
+    :param cache: SegmentCache to reuse across paths of the same scene (a new one if None)
+    :return: (path points, cost)
+    """
+    if cache is None:
+        cache = SegmentCache(bounds, obstacles)
+    points = random_shortcut(points, cache, attempts=attempts, rng=rng)
+    points = greedy_shortcut(points, cache)
+    points = smooth(points, cache, iterations=iterations)
+    return points, path_cost(points)
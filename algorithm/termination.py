@@ -0,0 +1,67 @@
+# termination.py
+# Planner termination: budgets and cancellation
+
+import threading
+import time
+
+
+class CancellationToken:
+    """ Flag used to cancel a running planner from another thread (or process, given a shared event) """
+
+    def __init__(self, event=None, every=1):
+        """
+        :param event: Event-like object with set() and is_set() (a new threading.Event if None)
+        :param every: Number of planner iterations between checks of the event (e.g. for a manager proxy, whose
+                      is_set() is a round trip to the manager process)
+        """
+        if every < 1:
+            raise ValueError('every ({}) must be >= 1'.format(every))
+        self.event = event if event is not None else threading.Event()
+        self.every = every
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class Budget:
+    """
+    Wall-clock, node and cancellation limits of a planner run.
+    Call reached() once per iteration; after it returns True, reason holds why the planner stopped.
+    """
+
+    reason = None
+
+    def __init__(self, time_budget=None, max_nodes=None, cancel=None, stats=None):
+        """
+        :param time_budget: Time in seconds after which to stop (None for no limit)
+        :param max_nodes: Number of tree nodes after which to stop (None for no limit)
+        :param cancel: CancellationToken (None if the run cannot be cancelled)
+        :param stats: PlannerStats notified of every iteration (None if not instrumented)
+        """
+        self.deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        self.max_nodes = max_nodes
+        self.cancel = cancel
+        self.stats = stats
+        self.reason = None
+        self.iterations = 0
+
+    def reached(self, n_nodes: int):
+        """
+        Check the budget
+        :param n_nodes: Current number of tree nodes
+        :return: True if the planner should stop
+        """
+        if self.stats is not None:
+            self.stats.iteration(n_nodes)
+        self.iterations += 1
+        if self.cancel is not None and self.iterations % self.cancel.every == 0 and self.cancel.cancelled:
+            self.reason = 'cancelled'
+        elif self.max_nodes is not None and n_nodes >= self.max_nodes:
+            self.reason = 'max_nodes'
+        elif self.deadline is not None and time.perf_counter() > self.deadline:
+            self.reason = 'time_budget'
+        return self.reason is not None
@@ -0,0 +1,294 @@
+# benchmark.py
+# Reproducible micro- and macro-benchmarks of the data structures and planners, with baseline comparison
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from algorithm.collision import valid
+from algorithm.nearest_neighbor import nearest_neighbor
+from algorithm.sampling import Sampler
+from algorithm.scene import Scene, SceneCache
+from evaluate import ALGORITHMS, run_trial
+from structs.cartesian import *
+from structs.kdtree import KDTree
+
+AXES = ('x', 'y', 'z') + tuple('q{}'.format(i) for i in range(3, 10))
+
+# Metrics compared to the baseline: relative for throughputs and memory, absolute for success rates
+HIGHER_IS_BETTER = ('ops_per_s', 'nodes_per_s')
+LOWER_IS_BETTER = ('peak_kb',)
+
+# Settings that must match between a run and its baseline (scenes and algorithms are part of the benchmark names)
+COMPARABLE_META = ('seed', 'trials', 'repeats', 'epsilon', 'limit', 'backend')
+
+
+def visualize_scene():
+    """ The predefined scene of visualize.py """
+    bounds = Space(x=(0, 10), y=(0, 10))
+    low = [[4, 2], [2, 6], [6, 4], [0, 2]]
+    high = [[8, 4], [4, 10], [8, 8], [2, 4]]
+    return Scene(bounds, Point(x=1, y=1), Point(x=9, y=9), low, high)
+
+
+def generated_scene(dim: int, n_obstacles: int, seed, cache=None):
+    """
+    Scene of evaluate.py generalized to dim dimensions: (-10, 10) bounds, start and goal in opposite corners
+    :param dim: Number of dimensions
+    :param n_obstacles: Number of obstacles
+    :param seed: Seed of the obstacle generation
+    :param cache: SceneCache to load the scene from (None to generate it)
+    :return: Scene
+    """
+    axes = AXES[:dim]
+    bounds = Space(**{c: (-10, 10) for c in axes})
+    start = Point(**{c: -9 for c in axes})
+    goal = Point(**{c: 9 for c in axes})
+    scene_seed = '{}/scene/{}/{}'.format(seed, dim, n_obstacles)
+    if cache is not None:
+        return cache.scene(bounds, start, goal, n_obstacles, size=2, seed=scene_seed)
+    return Scene.generate(bounds, start, goal, n_obstacles, size=2, seed=scene_seed)
+
+
+def scenes(dims: list, densities: list, seed, cache=None):
+    """ Returns the fixed benchmark scenes as a dictionary of name to Scene """
+    found = {'visualize': visualize_scene()}
+    for dim in dims:
+        for n_obstacles in densities:
+            found['{}d-{}obs'.format(dim, n_obstacles)] = generated_scene(dim, n_obstacles, seed, cache=cache)
+    return found
+
+
+def timed(func, number: int, repeats: int):
+    """
+    Time a function the way timeit does: best of repeats, each calling it number times
+    :return: Calls per second
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        gc.collect()
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - t0)
+    return number / best
+
+
+def micro_benchmarks(seed, repeats=5):
+    """
+    Benchmark the hot primitives of the planners
+    :param seed: Base seed
+    :param repeats: Number of timing repeats (the best one is reported)
+    :return: Dictionary of benchmark name to metrics
+    """
+    random.seed('{}/micro'.format(seed))
+    scene = generated_scene(2, 20, seed)
+    bounds, obstacles = scene.bounds, scene.obstacles
+    pts = bounds.sample(n=10000)
+    queries = bounds.sample(n=1000)
+    index = KDTree()
+    for pt in pts:
+        index.insert(pt)
+    grid = scene.index()
+    sampler = Sampler(bounds, seed=seed)
+
+    a, b = pts[0], pts[1]
+    few = pts[:1000]
+    cursor = iter(range(sys.maxsize))
+
+    def query():
+        return queries[next(cursor) % len(queries)]
+
+    results = {
+        'point.dist': timed(lambda: a.dist(b), 100000, repeats),
+        'nearest_neighbor.kdtree_10k': timed(lambda: nearest_neighbor(query(), index), 5000, repeats),
+        'nearest_neighbor.list_1k': timed(lambda: nearest_neighbor(query(), few), 200, repeats),
+        'valid.list_20': timed(lambda: valid(query(), bounds, obstacles), 20000, repeats),
+        'valid.grid_20': timed(lambda: valid(query(), bounds, grid), 20000, repeats),
+        'space.sample': timed(lambda: bounds.sample(), 50000, repeats),
+        'sampler.sample': timed(lambda: sampler.sample(), 50000, repeats)
+    }
+    return {name: {'ops_per_s': ops} for name, ops in results.items()}
+
+
+def macro_benchmarks(algorithms: list, scene_set: dict, epsilon: float, limit: int, trials: int, seed, backend='python', repeats=3, cache=None):
+    """
+    Run every planner on every scene. Like timed(), the seeded trials are run repeats times and the fastest repeat
+    is kept, so throughputs compared against a baseline are not dominated by noise
+    :param algorithms: Algorithm names (keys of ALGORITHMS)
+    :param scene_set: Dictionary of scene name to Scene
+    :param epsilon: Maximum distance to move between points
+    :param limit: Iteration limit of each run
+    :param trials: Number of seeded runs per (algorithm, scene)
+    :param seed: Base seed
+    :param backend: Planner backend
+    :param repeats: Number of timing repeats of the trials (the best one is kept)
+    :param cache: SceneCache to load the collision indexes from (None to build them)
+    :return: Dictionary of benchmark name to metrics
+    """
+    results = dict()
+    for scene, spec in scene_set.items():
+        bounds, start, goal = spec.bounds, spec.start, spec.goal
+        grid = cache.index(spec) if cache is not None else spec.index()
+        for algorithm in algorithms:
+            name = '{}.{}'.format(algorithm, scene)
+            print('{:<28}'.format(name), end='')
+            sys.stdout.flush()
+
+            # Best of repeats of all trials, as in timed(): seeded runs are identical apart from their timing
+            runs, total = None, float('inf')
+            for _ in range(repeats):
+                gc.collect()
+                repeated = [run_trial(algorithm, start, goal, bounds, epsilon, limit, grid, '{}/{}/{}'.format(seed, name, trial),
+                                      options={'backend': backend})
+                            for trial in range(trials)]
+                if sum(run['time'] for run in repeated) < total:
+                    runs, total = repeated, sum(run['time'] for run in repeated)
+            nodes = sum(run['nodes'] for run in runs)
+            costs = [run['cost'] for run in runs if run['cost'] is not None]
+
+            # Memory is measured on a separate run, tracing slows the planner down
+            tracemalloc.start()
+            run_trial(algorithm, start, goal, bounds, epsilon, limit, grid, '{}/{}/0'.format(seed, name), options={'backend': backend})
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            results[name] = {
+                'nodes_per_s': nodes / total if total else 0.0,
+                'success_rate': len(costs) / trials,
+                'mean_cost': sum(costs) / len(costs) if costs else None,
+                'mean_time_s': total / trials,
+                'peak_kb': peak / 1024
+            }
+            print('{nodes_per_s:>12.0f} nodes/s  {success_rate:>5.0%} success  {peak_kb:>9.0f} KB peak'.format(**results[name]))
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    Compare results to a baseline
+    :param results: Benchmark results
+    :param baseline: Baseline results (same layout)
+    :param tolerance: Allowed relative change in the bad direction before a metric counts as a regression
+    :return: List of (benchmark, metric, baseline value, new value, relative change) regressions
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, dict()).get(metric)
+            if value is None or not reference:
+                continue
+            if metric in HIGHER_IS_BETTER:
+                change = (value - reference) / reference
+                worse = change < -tolerance
+            elif metric in LOWER_IS_BETTER:
+                change = (value - reference) / reference
+                worse = change > tolerance
+            elif metric == 'success_rate':
+                change = value - reference
+                worse = change < -tolerance
+            else:
+                continue
+            if worse:
+                regressions.append((name, metric, reference, value, change))
+    return regressions
+
+
+def meta_mismatches(meta: dict, reference: dict):
+    """
+    Compare the settings of a run to those of its baseline
+    :param meta: Meta of the run
+    :param reference: Meta of the baseline (settings it does not record are not compared)
+    :return: List of (setting, baseline value, new value) that differ
+    """
+    return [(key, reference[key], meta[key]) for key in COMPARABLE_META if key in reference and reference[key] != meta[key]]
+
+
+def run_benchmarks(output=None, baseline=None, tolerance=0.2, seed=0, trials=5, epsilon=0.5, limit=5000, dims=None, densities=None,
+                   algorithms=None, backend='python', micro=True, macro=True, repeats=3, scene_cache=None):
+    """
+    Run the benchmark suite, save its results and compare them to a baseline
+    :return: List of regressions (empty if none or without baseline)
+    :raise ValueError: If the baseline was run with different settings (see COMPARABLE_META)
+    """
+    meta = {
+        'seed': seed, 'trials': trials, 'repeats': repeats, 'epsilon': epsilon, 'limit': limit, 'backend': backend,
+        'dims': dims or [2, 3, 4], 'densities': densities or [5, 20],
+        'python': platform.python_version(), 'machine': platform.machine(), 'date': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+    # Check the baseline before spending time on the benchmarks
+    reference = None
+    if baseline:
+        with open(baseline) as baseline_file:
+            reference = json.load(baseline_file)
+        mismatches = meta_mismatches(meta, reference.get('meta', dict()))
+        if mismatches:
+            raise ValueError('Baseline {} was run with different settings: {}'.format(
+                baseline, ', '.join('{} {} (baseline) != {}'.format(key, old, new) for key, old, new in mismatches)))
+
+    results = {'micro': dict(), 'macro': dict()}
+    if micro:
+        print('Micro-benchmarks')
+        results['micro'] = micro_benchmarks(seed)
+        for name, metrics in results['micro'].items():
+            print('{:<28}{:>12.0f} ops/s'.format(name, metrics['ops_per_s']))
+    if macro:
+        print('Macro-benchmarks (epsilon={}, limit={}, trials={}, repeats={}, backend={})'.format(epsilon, limit, trials, repeats, backend))
+        cache = SceneCache(scene_cache) if scene_cache else None
+        results['macro'] = macro_benchmarks(algorithms or list(ALGORITHMS), scenes(meta['dims'], meta['densities'], seed, cache=cache),
+                                            epsilon, limit, trials, seed, backend=backend, repeats=repeats, cache=cache)
+
+    report = {
+        'meta': meta,
+        'results': results
+    }
+    if output:
+        if os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w') as out_file:
+            json.dump(report, out_file, indent=2)
+        print('Results saved to {}'.format(output))
+
+    regressions = []
+    if reference is not None:
+        for group in results:
+            regressions += compare(results[group], reference['results'].get(group, dict()), tolerance)
+        print('Compared to {}: {} regression{}'.format(baseline, len(regressions), 's' if len(regressions) != 1 else ''))
+        for name, metric, old, new, change in regressions:
+            print('  {} {}: {:.4g} -> {:.4g} ({:+.0%})'.format(name, metric, old, new, change))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default=os.path.join('eval_data', 'benchmark.json'), help='results file (default: eval_data/benchmark.json)')
+    parser.add_argument('--baseline', default=None, help='results file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown counted as a regression (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=0, help='base seed (default: 0)')
+    parser.add_argument('--trials', type=int, default=5, help='runs per planner and scene (default: 5)')
+    parser.add_argument('--repeats', type=int, default=3, help='timing repeats of the macro-benchmark trials, the fastest is kept (default: 3)')
+    parser.add_argument('--epsilon', type=float, default=0.5, help='epsilon value for RRT algorithms (default: 0.5)')
+    parser.add_argument('--limit', type=int, default=5000, help='iteration limit for RRT algorithms (default: 5000)')
+    parser.add_argument('--dims', nargs='+', type=int, default=None, help='dimensions of the generated scenes (default: 2 3 4)')
+    parser.add_argument('--densities', nargs='+', type=int, default=None, help='obstacle counts of the generated scenes (default: 5 20)')
+    parser.add_argument('--algorithms', nargs='+', choices=list(ALGORITHMS), default=None, help='algorithms to run (default: all)')
+    parser.add_argument('--backend', choices=['python', 'numpy'], default='python', help='planner backend (default: python)')
+    parser.add_argument('--scene-cache', default=None, metavar='DIR', help='directory to store and reuse generated scenes and collision indexes in (default: none)')
+    parser.add_argument('--micro-only', action='store_true', help='only run the micro-benchmarks')
+    parser.add_argument('--macro-only', action='store_true', help='only run the macro-benchmarks')
+    args = parser.parse_args()
+    try:
+        found = run_benchmarks(output=args.output, baseline=args.baseline, tolerance=args.tolerance, seed=args.seed, trials=args.trials,
+                               epsilon=args.epsilon, limit=args.limit, dims=args.dims, densities=args.densities, algorithms=args.algorithms,
+                               backend=args.backend, micro=not args.macro_only, macro=not args.micro_only, repeats=args.repeats,
+                               scene_cache=args.scene_cache)
+    except ValueError as e:
+        parser.error(str(e))
+    sys.exit(1 if found else 0)
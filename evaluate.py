@@ -8,114 +8,175 @@ import os
 import random
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from json import dump
 
-from algorithm.rrt import rrt, rrt_connect, rrt_multi
+from algorithm.profiling import PlannerStats
+from algorithm.rrt import rrt, rrt_connect, rrt_multi, rrt_multi_connect, rrt_star
+from algorithm.sampling import Sampler
+from algorithm.scene import Scene, SceneCache
+from algorithm.smoothing import optimize_path
+from structs.archive import save_result
 from structs.cartesian import *
 from structs.tree import *
 
 
-def generate_obstacles(start: Point, goal: Point, n=5, size=1):
-    obstacles = []
-    corner_points = [
-        Point(x=start.coordinates['x'] - size / 2, y=start.coordinates['y'] - size / 2),  # Bottom left
-        Point(x=start.coordinates['x'] + size / 2, y=start.coordinates['y'] - size / 2),  # Bottom right
-        Point(x=start.coordinates['x'] - size / 2, y=start.coordinates['y'] + size / 2),  # Top left
-        Point(x=start.coordinates['x'] + size / 2, y=start.coordinates['y'] + size / 2),  # Top right
-        Point(x=goal.coordinates['x'] - size / 2, y=goal.coordinates['y'] - size / 2),  # Bottom left
-        Point(x=goal.coordinates['x'] + size / 2, y=goal.coordinates['y'] - size / 2),  # Bottom right
-        Point(x=goal.coordinates['x'] - size / 2, y=goal.coordinates['y'] + size / 2),  # Top left
-        Point(x=goal.coordinates['x'] + size / 2, y=goal.coordinates['y'] + size / 2)  # Top right
-    ]
-    for _ in range(n):
-        valid = False
-        obs = None
-        while not valid:
-            start_x = random.uniform(-10, 10)
-            start_y = random.uniform(-10, 10)
-            end_x = start_x + size
-            end_y = start_y + size
-
-            obs = Space(x=(start_x, end_x), y=(start_y, end_y))
-
-            if not any([obs.within(point) for point in corner_points]):
-                valid = True
-        obstacles.append(obs)
-    return obstacles
-
-
-def run_evaluations_batch(epsilon: float, limit: int, batch: int, n_obstacles: int):
+ALGORITHMS = {
+    'basic': rrt,
+    'connect': rrt_connect,
+    'multi': rrt_multi,
+    'multi-connect': rrt_multi_connect,
+    'star': rrt_star
+}
+
+
+def run_trial(algorithm: str, start: Point, goal: Point, bounds: Space, epsilon: float, limit: int, obstacles, seed, options=None, profile=False, archive=None,
+              smooth=False):
+    """
+    Run a single algorithm on a single scene
+    :param algorithm: Algorithm name (key of ALGORITHMS)
+    :param start: Starting point
+    :param goal: Goal point
+    :param bounds: Bounds of the configuration space
+    :param epsilon: Maximum distance to move between points
+    :param limit: Number of iterations/nodes to be added
+    :param obstacles: Obstacles in configuration space (list or ObstacleIndex)
+    :param seed: Seed of the run's Sampler (and of the path smoothing)
+    :param options: Extra keyword arguments for the algorithm (e.g. time_budget, max_nodes), plus the sampler's
+                    sequence and goal_bias
+    :param profile: Collect per-phase timers and counters
+    :param archive: Directory to save the trees and path in (see structs.archive; None to discard them)
+    :param smooth: Also shorten the path (see algorithm.smoothing) and report its cost and the time taken
+    :return: Dictionary of the number of nodes, time taken, path cost (None if no path was found), stop reason, whether a
+             path was found, smoothed path cost and time (if smoothed) and metrics (if profiled)
+    """
+    stats = PlannerStats() if profile else None
+    options = dict(options or {})
+    sampler = Sampler(bounds, seed=seed, sequence=options.pop('sequence', 'uniform'), goal=goal, goal_bias=options.pop('goal_bias', 0.0))
+
+    t0 = time.perf_counter()
+    trees, goal_node = ALGORITHMS[algorithm](start, goal, bounds, epsilon, limit=limit, obstacles=obstacles, stats=stats, sampler=sampler, **options)
+    t = time.perf_counter() - t0
+
+    # Get number of nodes from tree(s)
+    if isinstance(trees, tuple):
+        n_nodes = sum([len(tree.all_nodes) for tree in trees])
+        stop_reason = trees[0].stop_reason
+        solved = trees[0].solved
+    else:
+        n_nodes = len(trees.all_nodes)
+        stop_reason = trees.stop_reason
+        solved = trees.solved
+
+    # Compute path cost
+    cost = None
+    if goal_node:
+        trace, cost = traceback(goal_node)
+
+    result = {
+        'nodes': n_nodes,
+        'time': t,
+        'cost': cost,
+        'stop': stop_reason,
+        'solved': solved
+    }
+    if smooth:
+        t0 = time.perf_counter()
+        smoothed_cost = None
+        if goal_node:
+            _, smoothed_cost = optimize_path([node.data for node in trace], bounds, obstacles, rng=random.Random('{}/smooth'.format(seed)))
+        result['smoothed_cost'] = smoothed_cost
+        result['smooth_time'] = time.perf_counter() - t0
+    if stats is not None:
+        result['metrics'] = stats.as_dict()
+    if archive is not None:
+        save_result(archive, trees, goal_node, bounds=bounds, obstacles=obstacles)
+    return result
+
+
+def run_evaluations_batch(epsilon: float, limit: int, batch: int, n_obstacles: int, workers=1, seed=None, algorithms=None, options=None, profile=False,
+                          archive=None, occupancy=None, smooth=False, scene_cache=None):
     print('Running {2} iteration{4} with epsilon={0}, limit={1}, n_obstacles={3}'.format(epsilon, limit, batch, n_obstacles, 's' if batch != 1 else ''))
 
+    # Pick a base seed so the batch can be reproduced
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+    print('Using seed={}, workers={}'.format(seed, workers))
+    Sampler.check_sequence((options or {}).get('sequence', 'uniform'))
+
     bounds = Space(x=(-10, 10), y=(-10, 10))
     start_point = Point(x=-9, y=-9)
     goal_point = Point(x=9, y=9)
 
-    order = ['basic', 'connect', 'multi']
+    order = algorithms or ['basic', 'connect', 'multi']
     data = {
-        'nodes': {
-            'basic': [],
-            'connect': [],
-            'multi': []
-        },
-        'times': {
-            'basic': [],
-            'connect': [],
-            'multi': []
-        },
-        'costs': {
-            'basic': [],
-            'connect': [],
-            'multi': []
-        }
+        'nodes': {item: [] for item in order},
+        'times': {item: [] for item in order},
+        'costs': {item: [] for item in order},
+        'stops': {item: [] for item in order},
+        'solved': {item: [] for item in order}
     }
+    if smooth:
+        data['smoothed_costs'] = {item: [] for item in order}
+        data['smooth_times'] = {item: [] for item in order}
+    if profile:
+        data['metrics'] = {item: [] for item in order}
+
+    # Generate obstacles and their collision index once for each iteration, shared by all algorithms
+    # (and, with a scene cache, by every batch run with the same seed)
+    cache = SceneCache(scene_cache) if scene_cache else None
+
+    def scene_index(iteration):
+        scene_seed = '{}/{}'.format(seed, iteration)
+        if cache is not None:
+            scene = cache.scene(bounds, start_point, goal_point, n_obstacles, seed=scene_seed)
+            return cache.index(scene, occupancy=occupancy, max_clearance=2 * epsilon)
+        scene = Scene.generate(bounds, start_point, goal_point, n_obstacles, seed=scene_seed)
+        return scene.index(occupancy=occupancy, max_clearance=2 * epsilon)
+
+    # Submit (iteration, algorithm) jobs, each with its own deterministic seed. Scenes are built as their jobs
+    # are submitted and only a bounded number of jobs is in flight, so large indexes are never all held at once
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    max_in_flight = 4 * workers if executor else 0
+    jobs = dict()
+    submitted = 0
+
+    def submit(iteration):
+        obstacles = scene_index(iteration)
+        for item in order:
+            trial_archive = os.path.join(archive, '{}-{}'.format(iteration, item)) if archive else None
+            args = (item, start_point, goal_point, bounds, epsilon, limit, obstacles, '{}/{}/{}'.format(seed, iteration, item), options, profile, trial_archive,
+                    smooth)
+            jobs[(iteration, item)] = executor.submit(run_trial, *args) if executor else args
+
+    # Collect results in the original order
     for iteration in range(batch):
+        while submitted < batch and (submitted <= iteration or len(jobs) + len(order) <= max_in_flight):
+            submit(submitted)
+            submitted += 1
+
         print('iteration={}/{}'.format(iteration + 1, batch), end='...')
         sys.stdout.flush()
 
-        # Generate obstacles
-        obstacles = generate_obstacles(start_point, goal_point, n=n_obstacles)
-
-        # Run basic RRT
-        t0 = time.time()
-        basic_rrt, basic_goal = rrt(start_point, goal_point, bounds, epsilon, limit=limit, obstacles=obstacles)
-        basic_t = time.time() - t0
-
-        # Run RRT-connect
-        t0 = time.time()
-        connect_rrts, connect_goal = rrt_connect(start_point, goal_point, bounds, epsilon, limit=limit, obstacles=obstacles)
-        connect_t = time.time() - t0
-
-        # Run RRT-multi
-        t0 = time.time()
-        multi_rrt, multi_goal = rrt_multi(start_point, goal_point, bounds, epsilon, limit=limit, obstacles=obstacles)
-        multi_t = time.time() - t0
-
-        # Get number of nodes from trees
-        basic_n_nodes = len(basic_rrt.all_nodes)
-        connect_n_nodes = sum([len(tree.all_nodes) for tree in connect_rrts])
-        multi_n_nodes = len(multi_rrt.all_nodes)
-
-        # Compute path costs
-        basic_cost, connect_cost, multi_cost = (None, None, None)
-        if basic_goal:
-            basic_trace, basic_cost = traceback(basic_goal)
-        if connect_goal:
-            connect_trace, connect_cost = traceback(connect_goal)
-        if multi_goal:
-            multi_trace, multi_cost = traceback(multi_goal)
-
-        # Collect data
-        node_data = [basic_n_nodes, connect_n_nodes, multi_n_nodes]
-        time_data = [basic_t, connect_t, multi_t]
-        cost_data = [basic_cost, connect_cost, multi_cost]
-        for i, item in enumerate(order):
-            data['nodes'][item].append(node_data[i])
-            data['times'][item].append(time_data[i])
-            data['costs'][item].append(cost_data[i])
+        for item in order:
+            job = jobs.pop((iteration, item))
+            result = job.result() if executor else run_trial(*job)
+            data['nodes'][item].append(result['nodes'])
+            data['times'][item].append(result['time'])
+            data['costs'][item].append(result['cost'])
+            data['stops'][item].append(result['stop'])
+            data['solved'][item].append(result['solved'])
+            if smooth:
+                data['smoothed_costs'][item].append(result['smoothed_cost'])
+                data['smooth_times'][item].append(result['smooth_time'])
+            if profile:
+                data['metrics'][item].append(result['metrics'])
 
         print('done')
 
+    if executor:
+        executor.shutdown()
+
     # Dump JSON data
     if not os.path.isdir('eval_data'):
         os.mkdir('eval_data')
@@ -139,5 +200,24 @@ if __name__ == '__main__':
     parser.add_argument('limit', type=int, help='iteration limit for RRT algorithms')
     parser.add_argument('batch', type=int, help='batch size (an integer)')
     parser.add_argument('n_obstacles', type=int, help='number of obstacles to generate (an integer)')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (default: 1)')
+    parser.add_argument('--seed', type=int, default=None, help='base seed for reproducible batches (default: random)')
+    parser.add_argument('--algorithms', nargs='+', choices=list(ALGORITHMS), default=None, help='algorithms to run (default: basic connect multi)')
+    parser.add_argument('--time-budget', type=float, default=None, help='time budget per run in seconds (default: none)')
+    parser.add_argument('--max-nodes', type=int, default=None, help='maximum number of tree nodes per run (default: none)')
+    parser.add_argument('--min-spacing', type=float, default=None, help='reject nodes closer than this to an existing node (default: none)')
+    parser.add_argument('--node-cap', type=int, default=None, help='maximum number of nodes per tree, pruning dead-end leaves (default: none)')
+    parser.add_argument('--profile', action='store_true', help='record per-phase timers and counters under metrics')
+    parser.add_argument('--sequence', choices=Sampler.SEQUENCES, default='uniform', help='sample sequence (default: uniform)')
+    parser.add_argument('--goal-bias', type=float, default=0.0, help='probability of sampling the goal (default: 0)')
+    parser.add_argument('--archive', default=None, help='directory to save every run\'s trees and path in (default: none)')
+    parser.add_argument('--occupancy', type=float, default=None, metavar='RESOLUTION',
+                        help='rasterize each scene into an occupancy grid and distance field of this cell size (default: off)')
+    parser.add_argument('--smooth', action='store_true', help='shortcut and smooth every path, reporting smoothed costs alongside the raw ones')
+    parser.add_argument('--scene-cache', default=None, metavar='DIR', help='directory to store and reuse generated scenes and collision indexes in (default: none)')
     args = parser.parse_args()
-    run_evaluations_batch(args.epsilon, args.limit, args.batch, args.n_obstacles)
+    run_evaluations_batch(args.epsilon, args.limit, args.batch, args.n_obstacles, workers=args.workers, seed=args.seed, algorithms=args.algorithms,
+                          options={'time_budget': args.time_budget, 'max_nodes': args.max_nodes, 'sequence': args.sequence, 'goal_bias': args.goal_bias,
+                                   'min_spacing': args.min_spacing, 'node_cap': args.node_cap},
+                          profile=args.profile, archive=args.archive, occupancy=args.occupancy,
+                          smooth=args.smooth, scene_cache=args.scene_cache)
@@ -0,0 +1,115 @@
+# archive.py
+# Binary archives of planner results: trees and paths stored as flat .npy arrays
+
+import json
+import os
+
+import numpy as np
+
+from structs.cartesian import Point, Space
+from structs.tree import CompactTree, traceback
+
+FORMAT_VERSION = 1
+
+
+def values(pt: Point, axes: tuple):
+    """ Coordinates of a point in the given axis order """
+    return pt.values if pt.axes == axes else [pt.coordinates[c] for c in axes]
+
+
+def tree_arrays(tree, axes=None):
+    """
+    Flatten a tree into coordinate, parent index and cost arrays
+    :param tree: Tree or CompactTree
+    :param axes: Axis order of the coordinates (the root's if None)
+    :return: Tuple of (axes, coords, parents, costs)
+    """
+    if axes is None:
+        axes = tree.root.data.axes
+    if isinstance(tree, CompactTree) and tuple(axes) == tree.axes:
+        # Parents in another tree (rrt_connect bridges) are stored as -1; the archived path keeps the full route
+        n = tree.size
+        return tuple(axes), tree.coords[:n], tree.parents[:n], tree.costs[:n]
+
+    axes = tuple(axes)
+    nodes = list(tree.all_nodes)
+    positions = {id(node): i for i, node in enumerate(nodes)}
+    coords = np.array([values(node.data, axes) for node in nodes], dtype=float).reshape(len(nodes), len(axes))
+    parents = np.array([positions.get(id(node.parent), -1) if node.parent is not None else -1 for node in nodes], dtype=np.int64)
+    costs = np.array([node.cost for node in nodes], dtype=float)
+    return axes, coords, parents, costs
+
+
+def save_result(path: str, trees, goal_node=None, bounds=None, obstacles=None):
+    """
+    Save a planner result to a directory of .npy arrays and a meta.json file
+    :param path: Directory to write (created if needed)
+    :param trees: Tree or tuple of trees returned by a planner
+    :param goal_node: Goal node returned by a planner (None if no path was found)
+    :param bounds: Bounds of the configuration space (stored for rendering)
+    :param obstacles: Obstacles in configuration space (stored for rendering)
+    """
+    os.makedirs(path, exist_ok=True)
+    multiple = isinstance(trees, tuple)
+    trees = trees if multiple else (trees,)
+    axes = trees[0].root.data.axes
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'axes': list(axes),
+        'multiple': multiple,
+        'trees': [],
+        'cost': None,
+        'bounds': bounds.bounds if bounds is not None else None,
+        'obstacles': [obstacle.bounds for obstacle in obstacles] if obstacles is not None else None
+    }
+    for i, tree in enumerate(trees):
+        _, coords, parents, costs = tree_arrays(tree, axes)
+        np.save(os.path.join(path, 'tree{}.coords.npy'.format(i)), coords)
+        np.save(os.path.join(path, 'tree{}.parents.npy'.format(i)), parents)
+        np.save(os.path.join(path, 'tree{}.costs.npy'.format(i)), costs)
+        meta['trees'].append({'size': len(costs), 'stop_reason': tree.stop_reason})
+
+    if goal_node is not None:
+        trace, cost = traceback(goal_node)
+        np.save(os.path.join(path, 'trace.npy'), np.array([values(node.data, axes) for node in trace], dtype=float))
+        meta['cost'] = cost
+
+    with open(os.path.join(path, 'meta.json'), 'w') as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+
+def load_result(path: str, mmap=True):
+    """
+    Load a planner result saved with save_result
+    :param path: Result directory
+    :param mmap: Memory-map the arrays (copy-on-write) instead of reading them into memory
+    :return: Dictionary of trees (CompactTree or tuple, as saved), trace (array of path coordinates or None),
+             cost, axes, bounds (Space or None) and obstacles (list of Space or None)
+    """
+    with open(os.path.join(path, 'meta.json')) as meta_file:
+        meta = json.load(meta_file)
+    if meta.get('version') != FORMAT_VERSION:
+        raise ValueError('Unsupported result format version {} in {}'.format(meta.get('version'), path))
+    mmap_mode = 'c' if mmap else None
+    axes = tuple(meta['axes'])
+
+    def array(name):
+        return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+
+    trees = []
+    for i, info in enumerate(meta['trees']):
+        tree = CompactTree.from_arrays(axes, array('tree{}.coords.npy'.format(i)), array('tree{}.parents.npy'.format(i)),
+                                       array('tree{}.costs.npy'.format(i)))
+        tree.stop_reason = info['stop_reason']
+        trees.append(tree)
+
+    return {
+        'trees': tuple(trees) if meta['multiple'] else trees[0],
+        'trace': array('trace.npy') if meta['cost'] is not None else None,
+        'cost': meta['cost'],
+        'axes': axes,
+        'bounds': Space(**{axis: tuple(b) for axis, b in meta['bounds'].items()}) if meta['bounds'] else None,
+        'obstacles': [Space(**{axis: tuple(b) for axis, b in obstacle.items()}) for obstacle in meta['obstacles']]
+        if meta['obstacles'] is not None else None
+    }
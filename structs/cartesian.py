@@ -8,14 +8,42 @@ import math
 
 
 class Point:
-    """ Cartesian point of arbitrary dimension """
+    """ Cartesian point of arbitrary dimension, stored as a tuple of values in a fixed axis order """
 
-    coordinates = dict()
-    dim = 0
+    __slots__ = ('axes', 'values')
 
     def __init__(self, **coordinates):
-        self.coordinates = coordinates
-        self.dim = len(coordinates.keys())
+        self.axes = tuple(coordinates.keys())
+        self.values = tuple(coordinates.values())
+
+    @classmethod
+    def from_values(cls, axes: tuple, values):
+        """
+        Construct a point directly from an axis order and matching values
+        :param axes: Tuple of axis names
+        :param values: Iterable of coordinate values in axis order
+        :return: Point
+        """
+        pt = cls.__new__(cls)
+        pt.axes = axes
+        pt.values = tuple(values)
+        return pt
+
+    @property
+    def coordinates(self):
+        """ Keyword-coordinate view of the point """
+        return dict(zip(self.axes, self.values))
+
+    @property
+    def dim(self):
+        return len(self.values)
+
+    def aligned(self, other):
+        """ Returns the values of another point in this point's axis order """
+        if other.axes == self.axes:
+            return other.values
+        other_coordinates = other.coordinates
+        return tuple(other_coordinates[c] for c in self.axes)
 
     def __repr__(self):
         s = '('
@@ -24,16 +52,10 @@ class Point:
         return s
 
     def unary_el_op(self, op):
-        new_coordinates = dict()
-        for c, v in self.coordinates.items():
-            new_coordinates[c] = op(v)
-        return Point(**new_coordinates)
+        return Point.from_values(self.axes, [op(v) for v in self.values])
 
     def binary_el_op(self, other, op):
-        new_coordinates = dict()
-        for c, v in self.coordinates.items():
-            new_coordinates[c] = op(v, other.coordinates[c])
-        return Point(**new_coordinates)
+        return Point.from_values(self.axes, [op(a, b) for a, b in zip(self.values, self.aligned(other))])
 
     def __neg__(self):
         return self.unary_el_op(operator.neg)
@@ -45,39 +67,36 @@ class Point:
         return self.binary_el_op(other, operator.sub)
 
     def __mul__(self, other: float):
-        mul_coordinates = dict()
-        for c, v in self.coordinates.items():
-            mul_coordinates[c] = v * other
-        return Point(**mul_coordinates)
+        return Point.from_values(self.axes, [v * other for v in self.values])
 
     def __truediv__(self, other: float):
-        div_coordinates = dict()
-        for c, v in self.coordinates.items():
-            div_coordinates[c] = v / other
-        return Point(**div_coordinates)
+        return Point.from_values(self.axes, [v / other for v in self.values])
 
     def dist(self, other, p=2):
         """ Returns the Cartesian distance to another point """
+        if p == 2:
+            return math.sqrt(sum((a - b) ** 2 for a, b in zip(self.values, self.aligned(other))))
         d = 0.0
-        for c in self.coordinates.keys():
-            d += math.fabs(self.coordinates[c] - other.coordinates[c]) ** p
+        for a, b in zip(self.values, self.aligned(other)):
+            d += math.fabs(a - b) ** p
         return d ** (1.0 / p)
 
     def norm(self, p=2):
-        return self.dist(Point(**dict(zip(
-            self.coordinates.keys(),
-            [0.0 for _ in range(len(self.coordinates.keys()))]
-        ))))
+        if p == 2:
+            return math.sqrt(sum(v * v for v in self.values))
+        return sum(math.fabs(v) ** p for v in self.values) ** (1.0 / p)
 
 
 class Space:
     """ Cartesian space of arbitrary dimension """
 
     bounds = None
+    axes = None
     dim = 0
 
     def __init__(self, **bounds):
         self.bounds = bounds
+        self.axes = tuple(bounds.keys())
         self.dim = len(bounds.keys())
 
     def sample(self, n=1):
@@ -91,14 +110,14 @@ class Space:
             raise ValueError('n ({}) must be > 0'.format(n))
 
         pts = []
+        bound_values = tuple(self.bounds.values())
         for _ in range(n):
-            coordinate_dict = dict()
-            for coordinate, bound in self.bounds.items():
-                coordinate_dict[coordinate] = uniform(bound[0], bound[1])
-            pts.append(Point(**coordinate_dict))
+            pts.append(Point.from_values(self.axes, [uniform(bound[0], bound[1]) for bound in bound_values]))
         if n == 1:
             return pts[0]
         return pts
 
     def within(self, pt: Point):
-        return all([self.bounds[c][0] <= pt.coordinates[c] <= self.bounds[c][1] for c in pt.coordinates.keys()])
+        if pt.axes == self.axes:
+            return all(bound[0] <= v <= bound[1] for bound, v in zip(self.bounds.values(), pt.values))
+        return all([self.bounds[c][0] <= v <= self.bounds[c][1] for c, v in zip(pt.axes, pt.values)])
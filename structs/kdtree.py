@@ -0,0 +1,253 @@
+# kdtree.py
+# Incremental KD-tree data structure
+
+from array import array
+from heapq import heappop, heappush
+
+
+class KDTree:
+    """
+    Incremental KD-tree over points of arbitrary (fixed) dimension.
+    Items may be inserted at any time. The tree structure and coordinates are kept in flat arrays.
+    """
+
+    axes = None
+    dim = 0
+    size = 0
+    removed = 0
+    evaluations = 0
+
+    def __init__(self, key=None, wrap=None):
+        """
+        :param key: Function mapping an inserted item to its Point (identity if None)
+        :param wrap: Function mapping an insertion position to the returned item.
+                     When given, inserted items are not stored.
+        """
+        self.key = key
+        self.wrap = wrap
+        self.axes = None
+        self.dim = 0
+        self.size = 0
+        self.removed = 0
+        self.evaluations = 0
+        self.items = []
+        self.coords = array('d')
+        self.split = array('B')
+        self.left = array('l')
+        self.right = array('l')
+
+        # Removed entries stay in the tree structure but are skipped by queries
+        self.dead = bytearray()
+        self.positions = None
+
+    def __len__(self):
+        return self.size - self.removed
+
+    def _values(self, point):
+        if point.axes == self.axes:
+            return point.values
+        coordinates = point.coordinates
+        return tuple(coordinates[c] for c in self.axes)
+
+    def _item(self, i: int):
+        return self.wrap(i) if self.wrap else self.items[i]
+
+    def insert(self, item, point=None):
+        """
+        Insert an item into the tree
+        :param item: Item to insert
+        :param point: Point of the item (computed with key if None)
+        """
+        if point is None:
+            point = self.key(item) if self.key else item
+        if self.axes is None:
+            self.axes = point.axes
+            self.dim = len(point.axes)
+        values = self._values(point)
+        coords, left, right, split, dim = self.coords, self.left, self.right, self.split, self.dim
+
+        new = self.size
+        coords.extend(values)
+        left.append(-1)
+        right.append(-1)
+        self.dead.append(0)
+        if not self.wrap:
+            self.items.append(item)
+            if self.positions is not None:
+                self.positions[id(item)] = new
+        self.size += 1
+
+        if new == 0:
+            split.append(0)
+            return
+
+        i = 0
+        while True:
+            axis = split[i]
+            if values[axis] < coords[i * dim + axis]:
+                if left[i] < 0:
+                    left[i] = new
+                    break
+                i = left[i]
+            else:
+                if right[i] < 0:
+                    right[i] = new
+                    break
+                i = right[i]
+        split.append((split[i] + 1) % dim)
+
+    def remove(self, item):
+        """
+        Remove an item from the tree. The tree is rebuilt once more than half of its entries are removed.
+        :param item: Item to remove (or insertion position if the tree was created with wrap)
+        """
+        if self.wrap:
+            i = item
+        else:
+            # Position lookup is only maintained once items start being removed
+            if self.positions is None:
+                self.positions = {id(it): i for i, it in enumerate(self.items) if not self.dead[i]}
+            i = self.positions.pop(id(item))
+        if self.dead[i]:
+            return
+        self.dead[i] = 1
+        self.removed += 1
+
+        if not self.wrap and self.removed > self.size // 2:
+            self.rebuild()
+
+    def rebuild(self):
+        """ Rebuild the tree from its remaining items (only for trees storing their items) """
+        dim = self.dim
+        live = [(item, self.coords[i * dim:(i + 1) * dim]) for i, item in enumerate(self.items) if not self.dead[i]]
+        axes, positions, evaluations = self.axes, self.positions, self.evaluations
+        self.__init__(key=self.key)
+        self.axes, self.dim, self.evaluations = axes, dim, evaluations
+        if positions is not None:
+            self.positions = dict()
+        for item, values in live:
+            self.insert(item, _Values(axes, tuple(values)))
+
+    def nearest(self, point, checks=None):
+        """
+        Returns the item nearest to a point
+        :param point: Reference point
+        :param checks: Maximum number of nodes to visit (approximate search); exact search if None
+        :return: Nearest item, or None if the tree is empty
+        """
+        if not len(self):
+            return None
+        values = self._values(point)
+        if checks is not None:
+            return self._nearest_approximate(values, checks)
+        coords, left, right, split, dim = self.coords, self.left, self.right, self.split, self.dim
+        dims = range(dim)
+
+        dead = self.dead
+        best, best_d = -1, float('inf')
+        visited = 0
+        stack = [(0, 0.0)]
+        while stack:
+            i, plane_d = stack.pop()
+            # Skip subtrees whose splitting plane is farther than the current best
+            if i < 0 or plane_d >= best_d:
+                continue
+            visited += 1
+            base = i * dim
+            d = 0.0
+            for k in dims:
+                t = values[k] - coords[base + k]
+                d += t * t
+            if d < best_d and not dead[i]:
+                best, best_d = i, d
+            axis = split[i]
+            diff = values[axis] - coords[base + axis]
+            near, far = (left[i], right[i]) if diff < 0 else (right[i], left[i])
+            stack.append((far, max(plane_d, diff * diff)))
+            stack.append((near, plane_d))
+        self.evaluations += visited
+        return self._item(best) if best >= 0 else None
+
+    def _nearest_approximate(self, values, checks: int):
+        """
+        Best-bin-first search: branches are explored in order of their distance to the point,
+        and the search stops after visiting checks nodes. In high dimensions this finds the exact
+        nearest neighbor in most queries at a fraction of the cost of an exact search.
+        """
+        coords, left, right, split, dim, dead = self.coords, self.left, self.right, self.split, self.dim, self.dead
+        dims = range(dim)
+
+        best, best_d = -1, float('inf')
+        visited = 0
+        heap = [(0.0, 0)]
+        while heap and (visited < checks or best < 0):
+            plane_d, i = heappop(heap)
+            if plane_d >= best_d:
+                break
+            # Descend to a leaf, queueing the far side of every split
+            while i >= 0:
+                visited += 1
+                base = i * dim
+                d = 0.0
+                for k in dims:
+                    t = values[k] - coords[base + k]
+                    d += t * t
+                if d < best_d and not dead[i]:
+                    best, best_d = i, d
+                axis = split[i]
+                diff = values[axis] - coords[base + axis]
+                near, far = (left[i], right[i]) if diff < 0 else (right[i], left[i])
+                if far >= 0:
+                    heappush(heap, (max(plane_d, diff * diff), far))
+                i = near
+        self.evaluations += visited
+        return self._item(best) if best >= 0 else None
+
+    def within(self, point, distance: float):
+        """
+        Returns all items strictly within a distance of a point
+        :param point: Reference point
+        :param distance: Search radius
+        :return: List of items
+        """
+        if not len(self):
+            return []
+        values = self._values(point)
+        coords, left, right, split, dim = self.coords, self.left, self.right, self.split, self.dim
+        dims = range(dim)
+
+        dead = self.dead
+        r2 = distance * distance
+        found = []
+        visited = 0
+        stack = [0]
+        while stack:
+            i = stack.pop()
+            if i < 0:
+                continue
+            visited += 1
+            base = i * dim
+            d = 0.0
+            for k in dims:
+                t = values[k] - coords[base + k]
+                d += t * t
+            if d < r2 and not dead[i]:
+                found.append(self._item(i))
+            axis = split[i]
+            diff = values[axis] - coords[base + axis]
+            if diff < distance:
+                stack.append(left[i])
+            if diff > -distance:
+                stack.append(right[i])
+        self.evaluations += visited
+        return found
+
+
+class _Values:
+    """ Minimal point stand-in used to re-insert stored coordinates """
+
+    __slots__ = ('axes', 'values')
+
+    def __init__(self, axes, values):
+        self.axes = axes
+        self.values = values
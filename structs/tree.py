@@ -1,12 +1,22 @@
 # tree.py
 # Tree data structure
 
+import numpy as np
+
+from structs.cartesian import Point
+from structs.kdtree import KDTree
+
 
 class Tree:
     """ Simple tree data structure """
 
     root = None
     all_nodes = None
+    index = None
+    stop_reason = None
+    solved = False
+    # Number of nodes added after the root, including pruned ones
+    added = 0
 
     def __init__(self, root=None):
         if root:
@@ -15,21 +25,365 @@ class Tree:
             self.root = TreeNode()
         self.all_nodes = [self.root]
 
+        # Spatial index over node data, only available when the root has data
+        self.index = KDTree(key=lambda node: node.data)
+        if self.root.data is not None:
+            self.index.insert(self.root)
+
+    def add(self, parent, data, cost=0):
+        """
+        Create a new node as a child of parent and register it with the tree
+        :param parent: Parent node
+        :param data: Node data (Point)
+        :param cost: Node cost
+        :return: New node
+        """
+        node = TreeNode(parent=parent, data=data, cost=cost)
+        parent.children.append(node)
+        self.all_nodes.append(node)
+        self.index.insert(node)
+        self.added += 1
+        return node
+
+    def reparent(self, node, parent, cost):
+        """
+        Move a node under a new parent and propagate the change in cost to all of its descendants
+        :param node: Node to move
+        :param parent: New parent node
+        :param cost: New cost of the node
+        """
+        if node.parent:
+            node.parent.children.remove(node)
+        node.parent = parent
+        parent.children.append(node)
+
+        delta = cost - node.cost
+        stack = [node]
+        while stack:
+            descendant = stack.pop()
+            descendant.cost += delta
+            stack.extend(descendant.children)
+
+    def prune(self, nodes):
+        """
+        Remove nodes and all of their descendants from the tree
+        :param nodes: Nodes to remove (the root cannot be removed)
+        :return: List of removed nodes
+        """
+        removed = []
+        stack = list({id(node): node for node in nodes if node is not self.root}.values())
+        for node in stack:
+            if node.parent:
+                node.parent.children.remove(node)
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            removed.append(node)
+            stack.extend(node.children)
+
+        for node in removed:
+            self.index.remove(node)
+        if removed:
+            self.all_nodes = [node for node in self.all_nodes if id(node) not in seen]
+        return removed
+
+    def reindex(self):
+        """ Rebuild the spatial index, e.g. after node data was changed in place """
+        self.index = KDTree(key=lambda node: node.data)
+        for node in self.all_nodes:
+            if node.data is not None:
+                self.index.insert(node)
+
 
 class TreeNode:
     """ Tree node data structure """
 
-    parent = None
-    children = []
-    data = None
-    cost = 0
+    __slots__ = ('parent', 'children', 'data', 'cost')
 
     def __init__(self, parent=None, data=None, cost=0):
         self.parent = parent
+        self.children = []
         self.data = data
         self.cost = cost
 
 
+class CompactTree:
+    """
+    Tree data structure storing node coordinates, parent indices and costs in contiguous arrays.
+    Nodes are exposed as lightweight CompactTreeNode views so code written against Tree/TreeNode keeps working.
+    """
+
+    root = None
+    all_nodes = None
+    index = None
+    axes = None
+    stop_reason = None
+    solved = False
+    added = 0
+
+    def __init__(self, root: TreeNode, capacity=1024, indexed=True):
+        """
+        :param root: Root node (its data and cost are copied)
+        :param capacity: Initial array capacity
+        :param indexed: Maintain a KDTree index over the nodes
+        """
+        if root is None or root.data is None:
+            raise ValueError('CompactTree requires a root node with data')
+        self.axes = root.data.axes
+        self.size = 0
+        self.coords = np.empty((capacity, len(self.axes)))
+        self.parents = np.full(capacity, -1, dtype=np.int64)
+        self.costs = np.empty(capacity)
+
+        # Child adjacency (first child and next sibling of every node, -1 for none), so subtrees can be walked
+        # without scanning the parents array
+        self.first_child = np.full(capacity, -1, dtype=np.int64)
+        self.next_sibling = np.full(capacity, -1, dtype=np.int64)
+
+        # Parents living in another tree (e.g. after an rrt_connect bridge), keyed by node index
+        self.foreign_parents = dict()
+
+        self.all_nodes = CompactNodes(self)
+        self.index = KDTree(wrap=self.node) if indexed else None
+        self.root = self._append(root.data, -1, root.cost)
+
+    @classmethod
+    def from_arrays(cls, axes: tuple, coords, parents, costs, indexed=False):
+        """
+        Construct a tree directly over existing arrays (e.g. memory-mapped), without copying them
+        :param axes: Tuple of axis names
+        :param coords: Array of node coordinates, shape (n, len(axes))
+        :param parents: Array of parent indices (-1 for none), shape (n,)
+        :param costs: Array of node costs, shape (n,)
+        :param indexed: Build a KDTree index over the nodes
+        :return: CompactTree
+        """
+        if not len(costs):
+            raise ValueError('CompactTree requires a root node with data')
+        tree = cls.__new__(cls)
+        tree.axes = tuple(axes)
+        tree.size = len(costs)
+        tree.added = tree.size - 1
+        tree.coords, tree.parents, tree.costs = coords, parents, costs
+        # The child adjacency is built on first use, so memory-mapped trees open without a pass over their nodes
+        tree.first_child, tree.next_sibling = None, None
+        tree.foreign_parents = dict()
+        tree.all_nodes = CompactNodes(tree)
+        tree.index = KDTree(wrap=tree.node) if indexed else None
+        tree.reindex()
+        tree.root = CompactTreeNode(tree, 0)
+        return tree
+
+    def _append(self, data: Point, parent: int, cost: float):
+        if self.size == len(self.costs):
+            self._grow(2 * len(self.costs))
+        i = self.size
+        self.coords[i] = data.values if data.axes == self.axes else [data.coordinates[c] for c in self.axes]
+        self.parents[i] = parent
+        self.costs[i] = cost
+        self.size += 1
+        if parent >= 0:
+            self._link(i, parent)
+            self.added += 1
+
+        if self.index is not None:
+            self.index.insert(i, data)
+        return CompactTreeNode(self, i)
+
+    def _grow(self, capacity: int):
+        self.coords = np.resize(self.coords, (capacity, len(self.axes)))
+        parents = np.full(capacity, -1, dtype=np.int64)
+        parents[:self.size] = self.parents[:self.size]
+        self.parents = parents
+        self.costs = np.resize(self.costs, capacity)
+        if self.first_child is not None:
+            for name in ('first_child', 'next_sibling'):
+                links = np.full(capacity, -1, dtype=np.int64)
+                links[:self.size] = getattr(self, name)[:self.size]
+                setattr(self, name, links)
+
+    def _adjacency(self):
+        """ Returns the (first child, next sibling) arrays, building them from the parents array if needed """
+        if self.first_child is None:
+            first_child = np.full(len(self.costs), -1, dtype=np.int64)
+            next_sibling = np.full(len(self.costs), -1, dtype=np.int64)
+            for i in range(self.size - 1, -1, -1):
+                parent = self.parents[i]
+                if parent >= 0:
+                    next_sibling[i] = first_child[parent]
+                    first_child[parent] = i
+            self.first_child, self.next_sibling = first_child, next_sibling
+        return self.first_child, self.next_sibling
+
+    def _link(self, i: int, parent: int):
+        """ Register node i as a child of parent in the adjacency (if built) """
+        if self.first_child is not None:
+            self.next_sibling[i] = self.first_child[parent]
+            self.first_child[parent] = i
+
+    def _unlink(self, i: int):
+        """ Remove node i from the children of its (local) parent in the adjacency (if built) """
+        parent = self.parents[i]
+        if self.first_child is None or parent < 0:
+            return
+        child = self.first_child[parent]
+        if child == i:
+            self.first_child[parent] = self.next_sibling[i]
+        else:
+            while self.next_sibling[child] != i:
+                child = self.next_sibling[child]
+            self.next_sibling[child] = self.next_sibling[i]
+        self.next_sibling[i] = -1
+
+    def set_parent(self, i: int, parent: int):
+        """ Set the local parent index of node i (-1 for none), keeping the child adjacency up to date """
+        self._unlink(i)
+        self.parents[i] = parent
+        if parent >= 0:
+            self._link(i, parent)
+
+    def subtree(self, i: int):
+        """ Returns the indices of node i and all of its descendants """
+        first_child, next_sibling = self._adjacency()
+        found = []
+        stack = [i]
+        while stack:
+            j = stack.pop()
+            found.append(j)
+            child = first_child[j]
+            while child >= 0:
+                stack.append(child)
+                child = next_sibling[child]
+        return found
+
+    def add(self, parent, data, cost=0):
+        """
+        Create a new node as a child of parent and register it with the tree
+        :param parent: Parent node (a node of this tree)
+        :param data: Node data (Point)
+        :param cost: Node cost
+        :return: New node
+        """
+        return self._append(data, parent.index, cost)
+
+    def reparent(self, node, parent, cost):
+        """
+        Move a node under a new parent and propagate the change in cost to all of its descendants
+        :param node: Node to move (a node of this tree)
+        :param parent: New parent node (a node of this tree)
+        :param cost: New cost of the node
+        """
+        self._adjacency()
+        if self.parents[node.index] != parent.index:
+            self.set_parent(node.index, parent.index)
+        delta = cost - self.costs[node.index]
+
+        # Only the moved subtree is touched
+        self.costs[self.subtree(node.index)] += delta
+
+    def reindex(self):
+        """ Rebuild the spatial index (if any), e.g. after coordinates were changed in place """
+        if self.index is not None:
+            self.index = KDTree(wrap=self.node)
+            for i in range(self.size):
+                self.index.insert(i, self.point(i))
+
+    def node(self, i: int):
+        return CompactTreeNode(self, i)
+
+    def point(self, i: int):
+        return Point.from_values(self.axes, self.coords[i].tolist())
+
+
+class CompactNodes:
+    """ Sequence view over the nodes of a CompactTree """
+
+    __slots__ = ('tree',)
+
+    def __init__(self, tree: CompactTree):
+        self.tree = tree
+
+    def __len__(self):
+        return self.tree.size
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [CompactTreeNode(self.tree, j) for j in range(*i.indices(self.tree.size))]
+        if i < 0:
+            i += self.tree.size
+        if not 0 <= i < self.tree.size:
+            raise IndexError('node index out of range')
+        return CompactTreeNode(self.tree, i)
+
+    def __iter__(self):
+        for i in range(self.tree.size):
+            yield CompactTreeNode(self.tree, i)
+
+
+class CompactTreeNode:
+    """ View of a single node stored in a CompactTree """
+
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: CompactTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, CompactTreeNode) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        return 'CompactTreeNode({}, {})'.format(self.index, self.data)
+
+    @property
+    def data(self):
+        return self.tree.point(self.index)
+
+    @property
+    def cost(self):
+        return float(self.tree.costs[self.index])
+
+    @cost.setter
+    def cost(self, value):
+        self.tree.costs[self.index] = value
+
+    @property
+    def parent(self):
+        foreign = self.tree.foreign_parents.get(self.index)
+        if foreign is not None:
+            return foreign
+        parent = self.tree.parents[self.index]
+        return CompactTreeNode(self.tree, int(parent)) if parent >= 0 else None
+
+    @parent.setter
+    def parent(self, node):
+        self.tree.foreign_parents.pop(self.index, None)
+        if node is None:
+            self.tree.set_parent(self.index, -1)
+        elif isinstance(node, CompactTreeNode) and node.tree is self.tree:
+            self.tree.set_parent(self.index, node.index)
+        else:
+            self.tree.set_parent(self.index, -1)
+            self.tree.foreign_parents[self.index] = node
+
+    @property
+    def children(self):
+        tree = self.tree
+        first_child, next_sibling = tree._adjacency()
+        found = []
+        child = first_child[self.index]
+        while child >= 0:
+            found.append(int(child))
+            child = next_sibling[child]
+        return [CompactTreeNode(tree, i) for i in sorted(found)]
+
+
 def traceback(node: TreeNode):
     trace = [node]
     cost = 0
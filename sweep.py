@@ -0,0 +1,219 @@
+# sweep.py
+# Parameter sweeps of various RRT algorithms with resumable, streamed results
+
+
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from algorithm.sampling import Sampler
+from algorithm.scene import Scene, SceneCache
+from evaluate import ALGORITHMS, run_trial
+from structs.cartesian import *
+
+
+def parse_values(tokens: list, value_type):
+    """
+    Parse a list of parameter values. Each token is either a single value or an inclusive range start:stop[:step].
+    :param tokens: List of strings
+    :param value_type: int or float
+    :return: Sorted list of unique values
+    """
+    values = set()
+    for token in tokens:
+        parts = token.split(':')
+        if len(parts) == 1:
+            values.add(value_type(parts[0]))
+            continue
+        if len(parts) not in (2, 3):
+            raise ValueError('Invalid range \'{}\' (expected start:stop[:step])'.format(token))
+        start, stop = value_type(parts[0]), value_type(parts[1])
+        step = value_type(parts[2]) if len(parts) == 3 else value_type(1)
+        if not step > 0:
+            raise ValueError('Range step ({}) must be > 0'.format(step))
+        n_steps = int(round((stop - start) / step))
+        for i in range(n_steps + 1):
+            value = start + i * step
+            values.add(round(value, 10) if value_type is float else value)
+    return sorted(values)
+
+
+def trial_options(options: dict):
+    """ Returns the planner options of a trial as recorded in the results file (unset options are left out) """
+    return {name: value for name, value in (options or {}).items() if value is not None}
+
+
+def trial_key(record: dict):
+    """ Returns the key identifying a trial in the results file (rows written without options never match) """
+    options = record.get('options')
+    return (record['epsilon'], record['limit'], record['n_obstacles'], record['iteration'], record['algorithm'],
+            json.dumps(options, sort_keys=True) if options is not None else None)
+
+
+def load_completed(path: str):
+    """
+    Load the keys of trials already present in a results file.
+    A partially written last line (e.g. after a crash) is ignored.
+    :param path: JSON-lines results file
+    :return: Set of trial keys
+    """
+    completed = set()
+    if not os.path.isfile(path):
+        return completed
+    with open(path, 'r') as in_file:
+        for line in in_file:
+            try:
+                completed.add(trial_key(json.loads(line)))
+            except (ValueError, KeyError):
+                continue
+    return completed
+
+
+def open_results(path: str):
+    """ Open a results file for appending, terminating any partially written last line """
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    needs_newline = False
+    if os.path.isfile(path) and os.path.getsize(path) > 0:
+        with open(path, 'rb') as in_file:
+            in_file.seek(-1, os.SEEK_END)
+            needs_newline = in_file.read(1) != b'\n'
+    out_file = open(path, 'a')
+    if needs_newline:
+        out_file.write('\n')
+    return out_file
+
+
+def pending_trials(epsilons: list, limits: list, obstacle_counts: list, batch: int, algorithms: list, seed, completed: set, options=None, profile=False,
+                   cache=None):
+    """
+    Generate the trials of a sweep that are not yet completed, sharing scenes across epsilon, limit and algorithm
+    (and, with a SceneCache, across sweeps with the same seed)
+    """
+    bounds = Space(x=(-10, 10), y=(-10, 10))
+    start_point = Point(x=-9, y=-9)
+    goal_point = Point(x=9, y=9)
+    recorded = trial_options(options)
+
+    for n_obstacles, iteration in itertools.product(obstacle_counts, range(batch)):
+        scene, obstacles = None, None
+        for epsilon, limit, algorithm in itertools.product(epsilons, limits, algorithms):
+            record = {
+                'epsilon': epsilon,
+                'limit': limit,
+                'n_obstacles': n_obstacles,
+                'iteration': iteration,
+                'algorithm': algorithm,
+                'seed': '{}/{}/{}/{}/{}/{}'.format(seed, epsilon, limit, n_obstacles, iteration, algorithm),
+                'options': recorded
+            }
+            if trial_key(record) in completed:
+                continue
+
+            # Scenes (and their collision index) depend only on the obstacle count and iteration
+            if obstacles is None:
+                scene_seed = '{}/{}/{}'.format(seed, n_obstacles, iteration)
+                if cache is not None:
+                    scene = cache.scene(bounds, start_point, goal_point, n_obstacles, seed=scene_seed)
+                    obstacles = cache.index(scene)
+                else:
+                    scene = Scene.generate(bounds, start_point, goal_point, n_obstacles, seed=scene_seed)
+                    obstacles = scene.index()
+            record['scene'] = scene.hash
+
+            args = (algorithm, start_point, goal_point, bounds, epsilon, limit, obstacles, record['seed'], options, profile)
+            yield record, args
+
+
+def run_sweep(epsilons: list, limits: list, obstacle_counts: list, batch: int, output: str, algorithms=None, workers=1, seed=0, options=None, profile=False,
+              scene_cache=None):
+    """
+    Run every combination of parameters, streaming each finished trial as a JSON line to an append-only file.
+    Trials already present in the file with the same options are skipped, so an interrupted sweep can be restarted with
+    the same arguments.
+    :param epsilons: Epsilon values
+    :param limits: Iteration limits
+    :param obstacle_counts: Numbers of obstacles
+    :param batch: Number of scenes per obstacle count
+    :param output: JSON-lines results file
+    :param algorithms: Algorithm names (basic, connect and multi if None)
+    :param workers: Number of worker processes
+    :param seed: Base seed
+    :param options: Extra keyword arguments for the algorithms (e.g. time_budget, max_nodes)
+    :param profile: Record per-phase timers and counters with each trial
+    :param scene_cache: Directory to store and reuse generated scenes and collision indexes in (None to generate them)
+    """
+    algorithms = algorithms or ['basic', 'connect', 'multi']
+    Sampler.check_sequence((options or {}).get('sequence', 'uniform'))
+    completed = load_completed(output)
+    recorded = json.dumps(trial_options(options), sort_keys=True)
+    grid = set(itertools.product(epsilons, limits, obstacle_counts, range(batch), algorithms, [recorded]))
+    total = len(grid)
+    done = len(grid & completed)
+    print('Sweeping {} trials ({} already completed) into {}'.format(total, done, output))
+
+    trials = pending_trials(epsilons, limits, obstacle_counts, batch, algorithms, seed, completed, options=options, profile=profile,
+                            cache=SceneCache(scene_cache) if scene_cache else None)
+    with open_results(output) as out_file:
+        def write(record, result):
+            nonlocal done
+            record.update(result)
+            out_file.write(json.dumps(record) + '\n')
+            out_file.flush()
+            done += 1
+            print('\r{}/{} trials'.format(done, total), end='')
+            sys.stdout.flush()
+
+        if workers <= 1:
+            for record, args in trials:
+                write(record, run_trial(*args))
+        else:
+            # Keep a bounded number of trials in flight so large grids are never held in memory
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                in_flight = dict()
+                for record, args in trials:
+                    in_flight[executor.submit(run_trial, *args)] = record
+                    if len(in_flight) >= 4 * workers:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            write(in_flight.pop(future), future.result())
+                for future in list(in_flight):
+                    write(in_flight.pop(future), future.result())
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Values may be given as lists and/or inclusive ranges start:stop[:step]')
+    parser.add_argument('--epsilon', nargs='+', required=True, help='epsilon values for RRT algorithms')
+    parser.add_argument('--limit', nargs='+', required=True, help='iteration limits for RRT algorithms')
+    parser.add_argument('--n-obstacles', nargs='+', required=True, help='numbers of obstacles to generate')
+    parser.add_argument('--batch', type=int, required=True, help='number of scenes per obstacle count')
+    parser.add_argument('--algorithms', nargs='+', choices=list(ALGORITHMS), default=None, help='algorithms to run (default: basic connect multi)')
+    parser.add_argument('--output', default=os.path.join('eval_data', 'sweep.jsonl'), help='JSON-lines results file (default: eval_data/sweep.jsonl)')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='base seed (default: 0)')
+    parser.add_argument('--time-budget', type=float, default=None, help='time budget per run in seconds (default: none)')
+    parser.add_argument('--max-nodes', type=int, default=None, help='maximum number of tree nodes per run (default: none)')
+    parser.add_argument('--min-spacing', type=float, default=None, help='reject nodes closer than this to an existing node (default: none)')
+    parser.add_argument('--node-cap', type=int, default=None, help='maximum number of nodes per tree, pruning dead-end leaves (default: none)')
+    parser.add_argument('--profile', action='store_true', help='record per-phase timers and counters with each trial')
+    parser.add_argument('--sequence', choices=Sampler.SEQUENCES, default='uniform', help='sample sequence (default: uniform)')
+    parser.add_argument('--goal-bias', type=float, default=0.0, help='probability of sampling the goal (default: 0)')
+    parser.add_argument('--scene-cache', default=None, metavar='DIR', help='directory to store and reuse generated scenes and collision indexes in (default: none)')
+    args = parser.parse_args()
+    run_sweep(parse_values(args.epsilon, float),
+              parse_values(args.limit, int),
+              parse_values(args.n_obstacles, int),
+              args.batch,
+              args.output,
+              algorithms=args.algorithms,
+              workers=args.workers,
+              seed=args.seed,
+              options={'time_budget': args.time_budget, 'max_nodes': args.max_nodes, 'sequence': args.sequence, 'goal_bias': args.goal_bias,
+                       'min_spacing': args.min_spacing, 'node_cap': args.node_cap},
+              profile=args.profile,
+              scene_cache=args.scene_cache)
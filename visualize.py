@@ -1,19 +1,27 @@
 # visualize.py
 # Visualization of various RRT variations
 
+import argparse
+import os
+
 import matplotlib.lines as lines
 import matplotlib.patches as patches
 import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.collections import LineCollection
 
 import algorithm.rrt as rrt
+from structs.archive import load_result
 from structs.cartesian import *
 from structs.tree import *
 
 
 def draw_objects(axes: plt.Axes, objects: list):
+    """ Draw obstacles projected onto their first two axes """
     for obj in objects:
-        x_bounds = obj.bounds['x']
-        y_bounds = obj.bounds['y']
+        x_axis, y_axis = obj.axes[:2]
+        x_bounds = obj.bounds[x_axis]
+        y_bounds = obj.bounds[y_axis]
         x = x_bounds[0]
         w = x_bounds[1] - x
         y = y_bounds[0]
@@ -55,8 +63,7 @@ def visualize_rrt():
         trace, cost = traceback(goal_node)
         print('Path found containing {} nodes with cost of {}'.format(len(trace), cost))
 
-        trace_lines = [[tuple(trace[i].data.coordinates.values()),
-                        tuple(trace[i + 1].data.coordinates.values())]
+        trace_lines = [[trace[i].data.values[:2], trace[i + 1].data.values[:2]]
                        for i in range(len(trace) - 1)]
 
         for line in trace_lines:
@@ -67,5 +74,46 @@ def visualize_rrt():
     plt.show()
 
 
+def visualize_result(path: str):
+    """
+    Render a planner result saved with structs.archive.save_result, without rerunning the planner
+    :param path: Result directory
+    """
+    result = load_result(path)
+    trees = result['trees'] if isinstance(result['trees'], tuple) else (result['trees'],)
+
+    fig, axis = plt.subplots()
+    fig.set_size_inches(6, 6)
+    axis.set_title(os.path.basename(os.path.normpath(path)))
+    # Everything is projected onto the first two axes
+    x, y = 0, 1
+    if result['bounds'] is not None:
+        axis.set_xlim(result['bounds'].bounds[result['axes'][x]])
+        axis.set_ylim(result['bounds'].bounds[result['axes'][y]])
+    if result['obstacles'] is not None:
+        draw_objects(axis, result['obstacles'])
+
+    # Edges of all trees are drawn from the arrays directly, one LineCollection per tree
+    for tree, color in zip(trees, ['red', 'green']):
+        children = np.flatnonzero(tree.parents >= 0)
+        segments = np.stack([tree.coords[children][:, [x, y]], tree.coords[tree.parents[children]][:, [x, y]]], axis=1)
+        axis.add_collection(LineCollection(segments, linewidths=1, colors=color))
+        print('Tree with {} nodes (stopped: {})'.format(tree.size, tree.stop_reason))
+
+    if result['trace'] is not None:
+        print('Path containing {} nodes with cost of {}'.format(len(result['trace']), result['cost']))
+        axis.add_line(lines.Line2D(result['trace'][:, x], result['trace'][:, y], linewidth=2, color='blue'))
+    axis.autoscale_view()
+
+    plt.plot()
+    plt.show()
+
+
 if __name__ == '__main__':
-    visualize_rrt()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tree', default=None, help='render a saved result directory instead of running the planners')
+    args = parser.parse_args()
+    if args.tree:
+        visualize_result(args.tree)
+    else:
+        visualize_rrt()